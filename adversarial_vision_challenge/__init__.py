@@ -1,14 +1,60 @@
+import sys as _sys
 from os.path import join as _join
 from os.path import dirname as _dirname
 
 with open(_join(_dirname(__file__), 'VERSION')) as _f:
     __version__ = _f.read().strip()
 
-from .server import model_server  # noqa: F401
-from .client import TinyImageNetBSONModel  # noqa: F401
-from .utils import load_model  # noqa: F401
-from .utils import read_images  # noqa: F401
-from .utils import store_adversarial  # noqa: F401
-from .utils import get_test_data  # noqa: F401
-from .utils import attack_complete # noqa: F401
-from .notifier import ModelNotifications, AttackNotifications # noqa: F401
+# the public names and the modules defining them; the modules are only
+# imported when a name is first accessed, so that e.g. attacks don't
+# import Flask and models don't import foolbox
+_LAZY_NAMES = {
+    'model_server': 'server',
+    'TinyImageNetBSONModel': 'client',
+    'load_model': 'utils',
+    'read_images': 'utils',
+    'store_adversarial': 'utils',
+    'get_test_data': 'utils',
+    'attack_complete': 'utils',
+    'ModelNotifications': 'notifier',
+    'AttackNotifications': 'notifier',
+}
+
+# submodules that used to be imported with the package
+_LAZY_SUBMODULES = set([
+    'adversarial_writer', 'batch_scheduler', 'client', 'common',
+    'image_store', 'interaction_verifier', 'logger', 'metrics', 'notifier',
+    'prediction_cache', 'profiler', 'quota', 'retry_helper', 'server',
+    'utils', 'wire_codecs',
+])
+
+__all__ = sorted(_LAZY_NAMES)
+
+if _sys.version_info >= (3, 7):
+    import importlib as _importlib
+
+    def __getattr__(name):
+        if name in _LAZY_SUBMODULES:
+            return _importlib.import_module('.' + name, __name__)
+        module = _LAZY_NAMES.get(name)
+        if module is None:
+            raise AttributeError(
+                'module {0!r} has no attribute {1!r}'.format(__name__, name))
+        value = getattr(
+            _importlib.import_module('.' + module, __name__), name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_LAZY_NAMES) | _LAZY_SUBMODULES)
+
+else:  # pragma: no cover
+    # module level __getattr__ requires Python 3.7
+    from .server import model_server  # noqa: F401
+    from .client import TinyImageNetBSONModel  # noqa: F401
+    from .utils import load_model  # noqa: F401
+    from .utils import read_images  # noqa: F401
+    from .utils import store_adversarial  # noqa: F401
+    from .utils import get_test_data  # noqa: F401
+    from .utils import attack_complete # noqa: F401
+    from .notifier import ModelNotifications, AttackNotifications # noqa: F401
@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+from .logger import logger
+from .notifier import CrowdAiNotifier
+
+if sys.version_info > (3, 3):
+    import queue
+else:
+    import Queue as queue
+
+
+class AdversarialWriter(object):
+    """Saves adversarials and sends the corresponding notifications in a
+    background thread, so that the attack does not wait for the disk.
+
+    Adversarials that are queued while the thread is busy are written
+    and notified together. If max_pending adversarials are waiting,
+    store blocks until the thread has caught up.
+
+    Parameters
+    ----------
+    max_pending : int
+        The maximum number of adversarials waiting to be written.
+    notifier : object
+        Receives a store_adversarial(file_name) call for every
+        adversarial that has been written.
+
+    """
+
+    def __init__(self, max_pending=64, notifier=CrowdAiNotifier):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._notifier = notifier
+        self._error = None
+
+        thread = threading.Thread(target=self._run, args=())
+        thread.daemon = True
+        thread.start()
+
+    def store(self, path, file_name, adversarial):
+        """Queues the adversarial to be saved as path (without the .npy
+        extension). Blocks if too many adversarials are pending."""
+        self._raise_error()
+        self._queue.put((path, file_name, adversarial))
+
+    def flush(self):
+        """Blocks until all queued adversarials have been written to disk
+        and their notifications have been sent."""
+        self._queue.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                for path, _, adversarial in items:
+                    _save(path, adversarial)
+                for _, file_name, _ in items:
+                    self._notifier.store_adversarial(file_name)
+            except Exception as e:
+                logger.error('storing adversarials failed: %s', e)
+                self._error = e
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+
+def _save(path, adversarial):
+    """Saves the adversarial like np.save and makes sure it is on disk."""
+    with open(path + '.npy', 'wb') as f:
+        np.save(f, adversarial)
+        f.flush()
+        os.fsync(f.fileno())
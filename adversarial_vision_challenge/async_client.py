@@ -0,0 +1,185 @@
+"""asyncio counterpart of the HTTP model client (Python 3.5+).
+
+Requires aiohttp, which can be installed with
+`pip install adversarial_vision_challenge[async]`.
+"""
+import asyncio
+import json
+
+import aiohttp
+
+from . import wire_codecs
+from .client import HTTPClient, UnsupportedEndpointError, _check_prediction
+from .client import parse
+from .common import check_image
+from .logger import logger
+from .notifier import CrowdAiNotifier
+from .retry_helper import RetriesExceededError, CircuitOpenError
+from .retry_helper import RetryPolicy, CircuitBreaker, is_retryable_status
+
+
+class AsyncTinyImageNetBSONModel(HTTPClient):
+    """Connects to a model server and lets many predictions be in flight
+    at the same time from a single thread.
+
+    Unlike TinyImageNetBSONModel, this is not a foolbox model, all
+    methods that query the server are coroutines.
+
+    Parameters
+    ----------
+    url : str
+        The http or https URL of the server.
+    max_concurrency : int
+        The maximum number of requests in flight at the same time.
+    timeout : float
+        The timeout of a single request in seconds.
+    retries : int
+        The number of times a failed request is retried.
+    retry_policy : `RetryPolicy`
+        How failed requests are retried, overrides retries.
+
+    """
+
+    def __init__(self, url, max_concurrency=16, timeout=120, retries=3,
+                 retry_policy=None):
+        self._base_url = url
+        self._max_concurrency = max_concurrency
+        self._timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy(retries=retries)
+        self.circuit_breaker = CircuitBreaker()
+
+        # created on first use, so that they belong to the running loop
+        self._session = None
+        self._semaphore = None
+
+    def _url(self, path=''):
+        return parse.urljoin(self._base_url, path)
+
+    @property
+    def base_url(self):
+        return self._base_url
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout))
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._session
+
+    async def _request(self, method, path, **kwargs):
+        """
+        Sends a request and returns the content and the content type of
+        the response. Failed requests are retried like with retryable,
+        but the backoff does not block the event loop.
+        """
+        session = self._get_session()
+        url = self._url(path=path)
+        policy = self.retry_policy
+        breaker = self.circuit_breaker
+
+        start = asyncio.get_event_loop().time()
+        retried = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(
+                    'The server is unhealthy, not sending the request.')
+            try:
+                async with self._semaphore:
+                    async with session.request(method, url, **kwargs) as r:
+                        if r.status == 404:
+                            breaker.record_success()
+                            raise UnsupportedEndpointError(
+                                'The server does not provide {0}'.format(
+                                    path))
+                        if r.status >= 400 \
+                                and not is_retryable_status(r.status):
+                            # the server answered, it just rejected
+                            # the request
+                            breaker.record_success()
+                        r.raise_for_status()
+                        content = await r.read()
+                        breaker.record_success()
+                        return content, r.headers.get('content-type')
+            except aiohttp.ClientResponseError as e:
+                if not is_retryable_status(e.status):
+                    raise
+                breaker.record_failure()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                breaker.record_failure()
+
+            retried += 1
+            delay = policy.delay(retried)
+            elapsed = asyncio.get_event_loop().time() - start
+            if retried > policy.retries or (
+                    policy.deadline is not None
+                    and elapsed + delay > policy.deadline):
+                break
+            logger.info('Retrying for the %s. time in %.1f s', retried, delay)
+            await asyncio.sleep(delay)
+
+        logger.error('Retried request for %s times. Giving up.', retried - 1)
+        CrowdAiNotifier.retries_exceeded()
+        raise RetriesExceededError(
+            "Failed already {0} times. No further retrying.".format(retried))
+
+    async def _select_codec(self):
+        if self._codec is None:
+            try:
+                content_types = (await self._get('/codecs')).split(',')
+            except UnsupportedEndpointError:
+                content_types = [wire_codecs.BSON.content_type]
+            self._codec = wire_codecs.select_codec(content_types)
+        return self._codec
+
+    async def _post(self, path, data):
+        """
+        Encodes the data dictionary, posts it to the url specified by
+        path and returns the decoded result as a dictionary.
+        """
+        codec = await self._select_codec()
+        content, content_type = await self._request(
+            'POST', path, headers=self._post_headers(codec),
+            data=codec.encode(data))
+        return wire_codecs.get_codec(content_type).decode(content)
+
+    async def _get(self, path):
+        content, _ = await self._request('GET', path)
+        return content.decode('utf-8')
+
+    async def server_version(self):
+        return await self._get('/server_version')
+
+    async def quota(self):
+        """Returns the prediction quota of the server like
+        TinyImageNetBSONModel.quota."""
+        try:
+            return json.loads(await self._get('/quota'))
+        except UnsupportedEndpointError:
+            return None
+
+    async def predict(self, image):
+        """Returns the predicted class of the image."""
+        image = check_image(image)
+        result = await self._post('/predict', {'image': image})
+        return _check_prediction(result['prediction'])
+
+    async def predict_many(self, images):
+        """Predicts all images concurrently and returns their classes
+        in the same order."""
+        predictions = await asyncio.gather(
+            *[self.predict(image) for image in images])
+        return list(predictions)
+
+    async def close(self):
+        """Closes all connections to the server."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
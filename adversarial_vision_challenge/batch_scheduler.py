@@ -0,0 +1,135 @@
+import sys
+import threading
+import timeit
+from collections import Counter
+
+import numpy as np
+
+from .logger import logger
+
+if sys.version_info > (3, 3):
+    import queue
+else:
+    import Queue as queue
+
+
+class _PendingPrediction(object):
+    def __init__(self, image):
+        self.image = image
+        self.enqueued = timeit.default_timer()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchScheduler(object):
+    """Collects concurrent single-image predictions and runs them as one
+    batch prediction.
+
+    The first prediction that arrives opens a batch, which is closed once
+    it contains max_batch_size images or max_delay seconds have passed.
+    The batch is then passed to predict_batch in a background thread and
+    every waiting caller receives its own row of the result.
+
+    Parameters
+    ----------
+    predict_batch : callable
+        Takes a batch of images and returns one prediction per image.
+    max_batch_size : int
+        The maximum number of images in a batch.
+    max_delay : float
+        The maximum time in seconds a prediction waits for other
+        predictions to arrive.
+
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_delay=0.005):
+        self._predict_batch = predict_batch
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay
+        self._queue = queue.Queue()
+
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._max_queue_depth = 0
+        self._total_delay = 0.
+        self._max_delay_seen = 0.
+
+        thread = threading.Thread(target=self._run, args=())
+        thread.daemon = True
+        thread.start()
+        logger.info('batch scheduler started (max batch size: %s,'
+                    ' max delay: %ss)', max_batch_size, max_delay)
+
+    def predict(self, image):
+        """Returns the prediction for a single image once the batch
+        containing it has been processed."""
+        pending = _PendingPrediction(image)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self._max_delay
+        while len(batch) < self._max_batch_size:
+            timeout = deadline - timeit.default_timer()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self._record(batch)
+            try:
+                images = np.stack([pending.image for pending in batch])
+                results = self._predict_batch(images)
+                assert len(results) == len(batch), \
+                    'expected {0} predictions, but got {1}'.format(
+                        len(batch), len(results))
+            except Exception as e:
+                logger.error('batch prediction failed: %s', e)
+                for pending in batch:
+                    pending.error = e
+            else:
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            for pending in batch:
+                pending.done.set()
+
+    def _record(self, batch):
+        now = timeit.default_timer()
+        with self._lock:
+            self._batch_sizes[len(batch)] += 1
+            self._max_queue_depth = max(
+                self._max_queue_depth, len(batch) + self._queue.qsize())
+            for pending in batch:
+                delay = now - pending.enqueued
+                self._total_delay += delay
+                self._max_delay_seen = max(self._max_delay_seen, delay)
+
+    def stats(self):
+        """Returns the current queue depth, the distribution of batch
+        sizes and the time predictions spent waiting for their batch."""
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            images = sum(size * count
+                         for size, count in self._batch_sizes.items())
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'batches': batches,
+                'images': images,
+                'batch_sizes': dict(self._batch_sizes),
+                'mean_batch_size': images / float(batches) if batches else 0.,
+                'mean_queueing_delay': (
+                    self._total_delay / images if images else 0.),
+                'max_queueing_delay': self._max_delay_seen,
+            }
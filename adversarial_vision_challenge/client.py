@@ -1,15 +1,18 @@
+import json
 import sys
 from abc import abstractmethod
+from collections import OrderedDict
 
 import requests
 import numpy as np
 from foolbox.models import Model
-import bson
 import os
 
-from .retry_helper import retryable
+from .retry_helper import retryable, RetryPolicy, CircuitBreaker
 from .logger import logger
-from .common import check_image, _assert
+from .common import check_image, check_images, _assert
+from . import wire_codecs
+from .prediction_cache import PredictionCache, image_digest
 
 if sys.version_info > (3, 3):
     import urllib.parse as parse
@@ -17,57 +20,44 @@ else:
     import urlparse as parse
 
 
+class UnsupportedEndpointError(Exception):
+    """Raised if the server does not provide the requested endpoint,
+    e.g. because it runs an older version of this package."""
+    pass
+
+
 class HTTPClient(object):
     """Base class for HTTPModel and HTTPAttack."""
 
-    def _encode_array_data(self, array):
-        """
-        Converts a numpy array to bytes.
-        """
-        return array.tobytes()
+    _timeout = None
+    _codec = None
+    retry_policy = None
+    circuit_breaker = None
 
-    def _decode_array_data(self, data, dtype, shape):
+    def _select_codec(self):
         """
-        Converts bytes to a numpy array.
+        Returns the fastest codec supported by the server. Servers that
+        don't list their codecs only support BSON.
         """
-        return np.frombuffer(data, dtype=dtype).reshape(shape)
+        if self._codec is None:
+            try:
+                content_types = self._get('/codecs').split(',')
+            except UnsupportedEndpointError:
+                content_types = [wire_codecs.BSON.content_type]
+            self._codec = wire_codecs.select_codec(content_types)
+            logger.debug('using codec %s', self._codec.content_type)
+        return self._codec
 
-    def _encode_arrays(self, data):
-        """
-        Can be used by subclasses to encode numpy arrays. To use it,
-        subclasses must implement _encode_array_data.
+    def _post_headers(self, codec):
         """
-        encoded = {}
-        for key in list(data.keys()):
-            if isinstance(data[key], np.ndarray):
-                array = data[key]
-                encoded[key] = {
-                    'type': 'array',
-                    'shape': array.shape,
-                    'dtype': array.dtype.str,
-                    'data': self._encode_array_data(array),
-                }
-            else:
-                encoded[key] = data[key]
-        return encoded
-
-    def _decode_arrays(self, encoded):
+        Returns the headers of post requests encoded with the given codec.
         """
-        Can be used by subclasses to decode numpy arrays. To use it,
-        subclasses must implement _decode_array_data.
-        """
-        decoded = {}
-        for key in list(encoded.keys()):
-            if hasattr(encoded[key], 'get') \
-                    and encoded[key].get('type') == 'array':
-                shape = encoded[key]['shape']
-                dtype = encoded[key]['dtype']
-                data = encoded[key]['data']
-                array = self._decode_array_data(data, dtype, shape)
-                decoded[key] = array
-            else:
-                decoded[key] = encoded[key]
-        return decoded
+        headers = {'content-type': codec.content_type,
+                   'Accept': codec.content_type}
+        eval_secret = os.getenv('EVALUATOR_SECRET')
+        if eval_secret is not None:
+            headers['Evaluator-Secret'] = eval_secret
+        return headers
 
     @retryable
     def _post(self, path, data):
@@ -77,21 +67,19 @@ class HTTPClient(object):
         the result and returns it as a dictionary.
         """
         url = self._url(path=path)
-        
-        headers = {'content-type': 'application/bson'}
-        eval_secret = os.getenv('EVALUATOR_SECRET')
-        if eval_secret is not None:
-            headers['Evaluator-Secret'] = eval_secret
+        codec = self._select_codec()
+        headers = self._post_headers(codec)
 
-        data = self._encode_arrays(data)
-        data = bson.dumps(data)
-        r = self.requests.post(url, headers=headers, data=data)
+        data = codec.encode(data)
+        r = self.requests.post(
+            url, headers=headers, data=data, timeout=self._timeout)
+        if r.status_code == 404:
+            raise UnsupportedEndpointError(
+                'The server does not provide {0}'.format(path))
         r.raise_for_status()
         assert r.ok
-        result = r.content
-        result = bson.loads(result)
-        result = self._decode_arrays(result)
-        return result
+        codec = wire_codecs.get_codec(r.headers.get('content-type'))
+        return codec.decode(r.content)
 
     @retryable
     def _get(self, path):
@@ -101,7 +89,10 @@ class HTTPClient(object):
         if necessary.
         """
         url = self._url(path=path)
-        r = self.requests.get(url)
+        r = self.requests.get(url, timeout=self._timeout)
+        if r.status_code == 404:
+            raise UnsupportedEndpointError(
+                'The server does not provide {0}'.format(path))
         r.raise_for_status()
         assert r.ok
         return r.text
@@ -111,21 +102,76 @@ class HTTPClient(object):
         raise NotImplementedError
 
 
+def _check_prediction(prediction):
+    _assert(isinstance(prediction, int), "prediction should return an int value, but got: %s" % type(prediction))
+    _assert((0 <= prediction < 200), "prediction should be a value between 0 and 200, but got: %s" % prediction)
+    return prediction
+
+
+def _create_session(pool_size):
+    """Creates a requests session that keeps up to pool_size connections
+    to the server alive and reuses them for subsequent requests."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
 class TinyImageNetBSONModel(Model, HTTPClient):
     """Base class for models that connect to an http server and
     dispatch all requets to that server.
 
+    Connections to the server are kept alive and shared between threads,
+    use the model as a context manager or call close to release them.
+
     Parameters
     ----------
     url : str
         The http or https URL of the server.
+    max_batch_size : int
+        The maximum number of images sent to the server in a single
+        request. Larger batches are split into multiple requests.
+    pool_size : int
+        The maximum number of connections kept alive, i.e. the number of
+        threads that can query the server concurrently without opening
+        new connections.
+    timeout : float or tuple
+        The connect and read timeout in seconds, either as a single value
+        or as a (connect, read) tuple. None waits forever.
+    cache_size : int
+        If larger than 0, up to this many predictions are cached, so that
+        querying the same (quantized) image again neither needs a request
+        nor counts towards the quota. Disabled by default.
+    cache_bytes : int
+        The approximate maximum memory used by the cache, or None for
+        no limit.
+    retry_policy : `RetryPolicy`
+        How failed requests are retried. Defaults to RetryPolicy().
+
+    The circuit_breaker attribute tells whether the server is considered
+    unhealthy, in which case requests fail immediately with
+    CircuitOpenError.
 
     """
 
-    def __init__(self, url):
-        self.requests = requests
+    def __init__(self, url, max_batch_size=100, pool_size=10,
+                 timeout=(10, 120), cache_size=0, cache_bytes=None,
+                 retry_policy=None):
+        self.requests = _create_session(pool_size)
+        self._timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = CircuitBreaker()
+
+        self.cache = None
+        if cache_size > 0:
+            self.cache = PredictionCache(cache_size, cache_bytes)
+        self._source_image = None
 
         self._base_url = url
+        self._max_batch_size = max_batch_size
+        self._supports_batches = True
 
         super(TinyImageNetBSONModel, self).__init__(
             bounds=(0, 255), channel_axis=3)
@@ -137,27 +183,115 @@ class TinyImageNetBSONModel(Model, HTTPClient):
     def base_url(self):
         return self._base_url
 
+    def close(self):
+        """Closes all connections to the server."""
+        self.requests.close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def server_version(self):
         return self._get('/server_version')
 
+    def quota(self):
+        """Returns the prediction quota of the server as a dictionary with
+        the limit and the number of used, remaining and rejected
+        predictions, or None if the server does not report its quota."""
+        try:
+            return json.loads(self._get('/quota'))
+        except UnsupportedEndpointError:
+            return None
+
     def __call__(self, image):
         return self.predict(image)
 
     def predict(self, image):
         image = check_image(image)
-        data = {'image': image}
-        result = self._post('/predict', data)
+        if self.cache is None:
+            return self._query(image)
 
-        prediction = result['prediction']
-        _assert(isinstance(prediction, int), "prediction should return an int value, but got: %s" % type(prediction))
-        _assert((0 <= prediction < 200), "prediction should be a value between 0 and 200, but got: %s" % prediction)
+        key = image_digest(image)
+        prediction = self.cache.get(key)
+        if prediction is None:
+            prediction = self._query(image)
+            self.cache.put(key, prediction, self._source_image)
         return prediction
 
+    def _query(self, image):
+        result = self._post('/predict', {'image': image})
+        return _check_prediction(result['prediction'])
+
+    def predict_batch(self, images):
+        """Returns the predicted class of every image in the batch."""
+        images, clipped_low, clipped_high = check_images(images)
+        if clipped_low.any():
+            logger.warning('clipped values smaller than 0 to 0 in %d images',
+                           np.count_nonzero(clipped_low))
+        if clipped_high.any():
+            logger.warning(
+                'clipped values greater than 255 to 255 in %d images',
+                np.count_nonzero(clipped_high))
+        if self.cache is None:
+            return self._query_batch(images)
+
+        keys = [image_digest(image) for image in images]
+        predictions = [self.cache.get(key) for key in keys]
+
+        # query every image that is not cached once, even if it
+        # appears multiple times in the batch
+        missing = OrderedDict()
+        for index, (key, prediction) in enumerate(zip(keys, predictions)):
+            if prediction is None and key not in missing:
+                missing[key] = index
+        if missing:
+            queried = self._query_batch(images[list(missing.values())])
+            queried = dict(zip(missing.keys(), queried))
+            for key, prediction in queried.items():
+                self.cache.put(key, prediction, self._source_image)
+            predictions = [queried[key] if prediction is None else prediction
+                           for key, prediction in zip(keys, predictions)]
+        return predictions
+
+    def _query_batch(self, images):
+        predictions = []
+        for start in range(0, len(images), self._max_batch_size):
+            batch = images[start:start + self._max_batch_size]
+            predictions.extend(self._query_chunk(batch))
+        return predictions
+
+    def _query_chunk(self, images):
+        if self._supports_batches:
+            try:
+                result = self._post('/predict_batch', {'images': images})
+            except UnsupportedEndpointError:
+                logger.info('model server does not support batch predictions,'
+                            ' falling back to single predictions')
+                self._supports_batches = False
+
+        if not self._supports_batches:
+            return [self._query(image) for image in images]
+
+        predictions = result['predictions']
+        _assert(len(predictions) == len(images), "predict_batch should return %s values, but got: %s" % (len(images), len(predictions)))
+        return [_check_prediction(prediction) for prediction in predictions]
+
+    def set_source_image(self, file_name):
+        """Adds all predictions cached from now on to the group of the
+        given source image, see clear_cache."""
+        self._source_image = file_name
+
+    def clear_cache(self, file_name=None):
+        """Removes the cached predictions of the given source image, or
+        all cached predictions if no file name is given."""
+        if self.cache is not None:
+            self.cache.clear(file_name)
+
     def batch_predictions(self, images):
-        assert images.shape[0] == 1
-        image = images[0]
-        predictions = self.predictions(image)
-        predictions = predictions[np.newaxis]
+        if images.shape[0] == 1:
+            return self.predictions(images[0])[np.newaxis]
+        classes = self.predict_batch(images)
+        predictions = np.zeros((len(classes), 200), dtype=np.float32)
+        predictions[np.arange(len(classes)), classes] = 1
         return predictions
 
     def predictions(self, image):
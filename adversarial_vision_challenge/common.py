@@ -25,6 +25,73 @@ def check_image(image):
     assert image.dtype == np.uint8
     return image
 
+
+def check_images(images, out=None, chunk_size=16):
+    """Validates and quantizes a batch of images like check_image.
+
+    Float32 images are clipped, rounded and converted in chunks of
+    chunk_size images, reusing a single float32 buffer, so that the
+    result is identical to calling check_image on every image without
+    allocating temporaries of the size of the batch.
+
+    Parameters
+    ----------
+    images : `numpy.ndarray`
+        A float32 or uint8 array of size Nx64x64x3.
+    out : `numpy.ndarray`
+        An optional uint8 array of size Nx64x64x3 the result is written
+        to. If not given, uint8 images are returned without copying.
+    chunk_size : int
+        The number of images processed at once.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        The quantized uint8 images.
+    `numpy.ndarray`
+        The number of values smaller than 0 per image.
+    `numpy.ndarray`
+        The number of values greater than 255 per image.
+
+    """
+    _assert(isinstance(
+        images, np.ndarray), "images should be an numpy array")
+    _assert(images.ndim == 4 and images.shape[1:] == (64, 64, 3),
+            "images should be of size Nx64x64x3")
+    assert images.dtype in (np.float32, np.uint8)
+
+    n = images.shape[0]
+    clipped_low = np.zeros(n, dtype=np.int64)
+    clipped_high = np.zeros(n, dtype=np.int64)
+
+    if images.dtype == np.uint8:
+        if out is None:
+            return images, clipped_low, clipped_high
+        out[...] = images
+        return out, clipped_low, clipped_high
+
+    if out is None:
+        out = np.empty(images.shape, dtype=np.uint8)
+    assert out.shape == images.shape and out.dtype == np.uint8
+
+    buffer = np.empty((min(n, chunk_size),) + images.shape[1:],
+                      dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        chunk = images[start:start + chunk_size]
+        rows = chunk.reshape(chunk.shape[0], -1)
+        # counting is only needed for the (rare) images that are clipped
+        for i in np.flatnonzero(rows.min(axis=1) < 0):
+            clipped_low[start + i] = np.count_nonzero(rows[i] < 0)
+        for i in np.flatnonzero(rows.max(axis=1) > 255):
+            clipped_high[start + i] = np.count_nonzero(rows[i] > 255)
+
+        work = buffer[:chunk.shape[0]]
+        np.clip(chunk, 0, 255, out=work)
+        np.rint(work, out=work)
+        out[start:start + chunk.shape[0]] = work
+    return out, clipped_low, clipped_high
+
+
 def check_track(directory, track):
     crowdai_json = os.path.join(directory, "crowdai.json")
     with open(crowdai_json) as file:
@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+
+
+class ImageStore(object):
+    """Images, file names and labels packed into a single directory.
+
+    The images are stored as one Nx64x64x3 uint8 array that is memory
+    mapped when the store is opened, so opening the store does not read
+    any images and every image can be accessed in constant time. File
+    names and labels are stored in a json index.
+
+    Use pack_images to create a store from a directory of .npy files.
+
+    Parameters
+    ----------
+    path : str
+        The directory containing the store.
+
+    """
+
+    IMAGES = 'images.npy'
+    INDEX = 'index.json'
+
+    def __init__(self, path):
+        self.images = np.load(os.path.join(path, self.IMAGES), mmap_mode='r')
+        with open(os.path.join(path, self.INDEX), 'r') as indexfile:
+            index = json.load(indexfile)
+        self.file_names = index['file_names']
+        self.labels = index['labels']
+        assert self.images.shape == (len(self.file_names), 64, 64, 3)
+        assert self.images.dtype == np.uint8
+        assert len(self.labels) == len(self.file_names)
+        self._positions = None
+
+    @staticmethod
+    def exists(path):
+        """Returns True if the directory contains a store."""
+        return path is not None \
+            and os.path.isfile(os.path.join(path, ImageStore.IMAGES)) \
+            and os.path.isfile(os.path.join(path, ImageStore.INDEX))
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def __getitem__(self, i):
+        """Returns the file name, the image and the label of the i-th
+        sample. The image is a read-only view into the store."""
+        return self.file_names[i], self.images[i], self.labels[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def get(self, file_name):
+        """Returns the image with the given file name."""
+        if self._positions is None:
+            self._positions = dict(
+                (name, i) for i, name in enumerate(self.file_names))
+        return self.images[self._positions[file_name]]
+
+
+def pack_images(labels, input_folder, output_folder):
+    """Packs the .npy images in input_folder into a store in
+    output_folder.
+
+    Parameters
+    ----------
+    labels : dict
+        Maps the file names of the images that should be packed to
+        their labels. Images are stored in the order of their file names.
+    input_folder : str
+        The directory containing the .npy files.
+    output_folder : str
+        The directory the store is written to.
+
+    """
+    file_names = sorted(labels.keys())
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    images = np.lib.format.open_memmap(
+        os.path.join(output_folder, ImageStore.IMAGES), mode='w+',
+        dtype=np.uint8, shape=(len(file_names), 64, 64, 3))
+    for i, file_name in enumerate(file_names):
+        image = np.load(os.path.join(input_folder, file_name))
+        assert image.dtype == np.uint8
+        assert image.shape == (64, 64, 3)
+        images[i] = image
+    images.flush()
+    del images
+
+    with open(os.path.join(output_folder, ImageStore.INDEX), 'w') as indexfile:
+        json.dump({
+            'file_names': file_names,
+            'labels': [int(labels[name]) for name in file_names],
+        }, indexfile)
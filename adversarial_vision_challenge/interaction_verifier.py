@@ -4,6 +4,7 @@ from .logger import logger
 from .notifier import CrowdAiNotifier
 import threading
 import uuid
+import multiprocessing
 
 
 class NoClientInteractionError(Exception):
@@ -29,16 +30,17 @@ class InteractionVerifier:
 
 
     def start(self):
-        self.__last_request = time.time()
+        # shared memory, so that forked worker processes can mark requests
+        self.__last_request = multiprocessing.Value('d', time.time())
         Caller()
         logger.info('Client <-> Server interaction monitor started...')
 
     def mark(self):
-        self.__last_request = time.time()
+        self.__last_request.value = time.time()
 
     def verify(self):
         now = time.time()
-        duration = now - self.__last_request
+        duration = now - self.__last_request.value
         if duration > self.__time_out:
             logger.error('Client has not sent any requests to to the server for more than %ss', duration)
             CrowdAiNotifier.no_client_interaction()
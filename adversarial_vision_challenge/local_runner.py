@@ -0,0 +1,268 @@
+"""Runs an attack against a model on the local machine, without Docker.
+
+The model submission is started in its own process and serves its model
+with model_server, the attack submission is started in another process
+with the same environment variables the evaluation sets in its
+container. Both run in the submission directory (instead of a
+container) and log to files in the working directory.
+"""
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import time
+
+import numpy as np
+import requests
+
+from .logger import logger
+from .result_watcher import ResultWatcher
+from . import scoring
+
+
+def _get_free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def prepare_samples(images_folder, results_folder, samples):
+    """Writes the first samples test images and their labels.yml to
+    images_folder and empties results_folder. Returns the labels."""
+    import yaml
+    from .utils import get_test_data
+
+    for folder in [images_folder, results_folder]:
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+
+    labels = {}
+    for k, (image, label) in enumerate(get_test_data()[:samples]):
+        file_name = 'img{0}.npy'.format(k)
+        np.save(os.path.join(images_folder, file_name), image)
+        labels[file_name] = int(label)
+    with open(os.path.join(images_folder, 'labels.yml'), 'w') as f:
+        yaml.dump(labels, f)
+    return labels
+
+
+class _Submission(object):
+    """A submission running command in directory in its own process
+    group, so that it can be stopped with all of its children."""
+
+    def __init__(self, name, directory, command, env, log_file):
+        logger.debug('starting %s: %s (in %s)', name, command, directory)
+        self.name = name
+        self.log_file = log_file
+        with open(log_file, 'wb') as log:
+            self.process = subprocess.Popen(
+                command, shell=True, cwd=directory, env=env, stdout=log,
+                stderr=subprocess.STDOUT, preexec_fn=os.setsid)
+
+    def poll(self):
+        return self.process.poll()
+
+    def stop(self, timeout=5.):
+        if self.process.poll() is not None:
+            return
+        for sig in [signal.SIGTERM, signal.SIGKILL]:
+            try:
+                os.killpg(self.process.pid, sig)
+            except OSError:
+                # the process group is already gone
+                break
+            deadline = time.time() + timeout
+            while self.process.poll() is None and time.time() < deadline:
+                time.sleep(0.05)
+            if self.process.poll() is not None:
+                break
+        self.process.wait()
+
+    def log_tail(self, lines=20):
+        with open(self.log_file, 'rb') as f:
+            data = f.read().decode('utf-8', 'replace')
+        return '\n'.join(data.splitlines()[-lines:])
+
+
+def _wait_until_ready(url, model, timeout):
+    """Polls /ready until the model server has warmed up."""
+    deadline = time.time() + timeout
+    while True:
+        if model.poll() is not None:
+            raise RuntimeError(
+                'The model stopped with exit code {0} before the server '
+                'started:\n{1}'.format(model.poll(), model.log_tail()))
+        try:
+            r = requests.get(url + '/ready', timeout=1)
+            # servers without /ready are ready once they answer
+            if r.ok or r.status_code == 404:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        if time.time() > deadline:
+            raise RuntimeError(
+                'The model server did not start within {0} seconds:\n'
+                '{1}'.format(timeout, model.log_tail()))
+        time.sleep(0.05)
+
+
+def _queried(url):
+    """Returns whether the model server has received a prediction
+    request, or None if it does not report its quota."""
+    try:
+        r = requests.get(url + '/quota', timeout=1)
+    except requests.exceptions.RequestException:
+        return False
+    if r.status_code == 404:
+        return None
+    stats = r.json()
+    return stats['used'] > 0 or stats['rejected'] > 0
+
+
+def run_local(model_directory, attack_directory, samples=10,
+              work_dir='avc_local', model_command='bash run.sh',
+              attack_command='bash run.sh', timeout=None, ready_timeout=120,
+              env=None, progress=None):
+    """Runs the attack submission against the model submission and
+    scores the adversarials.
+
+    Parameters
+    ----------
+    model_directory : str
+        The directory of the model submission.
+    attack_directory : str
+        The directory of the attack submission.
+    samples : int
+        The number of test images to attack.
+    work_dir : str
+        The directory the images, the results and the logs of both
+        submissions are written to. It is emptied first.
+    model_command : str
+        The shell command starting the model server, run in
+        model_directory.
+    attack_command : str
+        The shell command starting the attack, run in attack_directory.
+    timeout : float
+        The time in seconds after which the attack is stopped, or None.
+    ready_timeout : float
+        The time in seconds the model server may take to start.
+    env : dict
+        Additional environment variables of both submissions, e.g. GPU.
+    progress : callable
+        Called with the number of written adversarials whenever it grows.
+
+    Returns
+    -------
+    dict
+        The timings in seconds, the exit code of the attack (None if it
+        was stopped after timeout seconds) and the score of the
+        adversarials that have been written, see scoring.score, with
+        the names of the samples without one under 'missing'. Invalid
+        adversarials get the worst case distance.
+
+    """
+    start = time.time()
+    timings = {}
+    work_dir = os.path.abspath(work_dir)
+    images_folder = os.path.join(work_dir, 'images')
+    results_folder = os.path.join(work_dir, 'results')
+    labels = prepare_samples(images_folder, results_folder, samples)
+    timings['setup'] = time.time() - start
+
+    port = _get_free_port()
+    url = 'http://localhost:{0}'.format(port)
+    base_env = dict(os.environ)
+    base_env.update(env or {})
+    base_env['MODEL_SERVER'] = 'localhost'
+    base_env['MODEL_PORT'] = str(port)
+    # notifications are not sent to crowdAI but written to a file
+    base_env['NOTIFICATION_FILE'] = os.path.join(
+        work_dir, 'notifications.jsonl')
+
+    model_env = dict(base_env)
+    model_env['NUM_IMAGES'] = str(samples)
+    attack_env = dict(base_env)
+    attack_env['INPUT_IMG_PATH'] = images_folder
+    attack_env['INPUT_YML_PATH'] = os.path.join(images_folder, 'labels.yml')
+    attack_env['OUTPUT_ADVERSARIAL_PATH'] = results_folder
+
+    model_start = time.time()
+    model = _Submission('model', model_directory, model_command, model_env,
+                        os.path.join(work_dir, 'model.log'))
+    attack = None
+    watcher = ResultWatcher(results_folder)
+    try:
+        _wait_until_ready(url, model, ready_timeout)
+        timings['model_ready'] = time.time() - model_start
+
+        attack_start = time.time()
+        attack = _Submission('attack', attack_directory, attack_command,
+                             attack_env, os.path.join(work_dir, 'attack.log'))
+
+        results = set()
+        first_query = first_result = None
+        # polled frequently until the first query to measure its latency
+        check_queries = True
+        timed_out = False
+        while True:
+            done = attack.poll() is not None
+            now = time.time()
+            if check_queries:
+                queried = _queried(url)
+                if queried is None:
+                    check_queries = False
+                elif queried:
+                    first_query = now - attack_start
+                    check_queries = False
+
+            names = watcher.wait(timeout=0 if done else
+                                 0.05 if check_queries else 1)
+            if names:
+                if first_result is None:
+                    first_result = time.time() - attack_start
+                results.update(names)
+                if progress is not None:
+                    progress(len(results))
+
+            if done:
+                break
+            if timeout is not None and now - attack_start > timeout:
+                logger.warning('stopping the attack after %s seconds',
+                               timeout)
+                timed_out = True
+                attack.stop()
+                break
+        timings['attack'] = time.time() - attack_start
+        timings['first_query'] = first_query
+        timings['first_result'] = first_result
+    finally:
+        watcher.close()
+        if attack is not None:
+            attack.stop()
+        model.stop()
+
+    scoring_start = time.time()
+    # like the test scripts, all adversarials that have been written are
+    # scored, invalid ones with the worst case distance, the others are
+    # reported as missing
+    written = [name for name in sorted(labels)
+               if os.path.exists(os.path.join(results_folder, name))]
+    names, originals, adversarials, valid = scoring.load_results(
+        images_folder, results_folder, written)
+    report = scoring.score(
+        names, scoring.distances(originals, adversarials, valid), valid)
+    report['missing'] = sorted(set(labels) - set(written))
+    timings['scoring'] = time.time() - scoring_start
+    timings['total'] = time.time() - start
+
+    return {
+        'timings': timings,
+        'attack_exit_code': None if timed_out else attack.poll(),
+        'attack_log': attack.log_file,
+        'model_log': model.log_file,
+        'score': report,
+    }
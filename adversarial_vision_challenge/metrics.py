@@ -0,0 +1,203 @@
+"""Minimal metrics that can be exported in the Prometheus text format.
+
+Recording a value takes a lock and a few arithmetic operations, so the
+metrics can stay enabled under full load. Metrics with labels hand out
+one child per combination of label values; resolve children once with
+labels() and keep them to avoid the lookup on every request.
+"""
+import bisect
+import threading
+import timeit
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025,
+                   .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(name, value)
+                          for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric(object):
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self._labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self._labelnames:
+            self._children[()] = self._create_child()
+
+    def labels(self, *values):
+        """Returns the child for the given label values."""
+        assert len(values) == len(self._labelnames)
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._create_child()
+            return child
+
+    def __getattr__(self, name):
+        # metrics without labels record values directly
+        if name.startswith('_') or self._labelnames:
+            raise AttributeError(name)
+        return getattr(self._children[()], name)
+
+    def render(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.documentation),
+                 '# TYPE {0} {1}'.format(self.name, self._type)]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            labels = list(zip(self._labelnames, values))
+            lines.extend(self._render_child(labels, child))
+        return lines
+
+
+class _Value(object):
+
+    def __init__(self):
+        self._value = 0.
+        self._function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        """Reports the value returned by function at every export."""
+        self._function = function
+
+    def get(self):
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+
+class Counter(_Metric):
+    _type = 'counter'
+
+    def _create_child(self):
+        return _Value()
+
+    def _render_child(self, labels, child):
+        return ['{0}{1} {2}'.format(
+            self.name, _format_labels(labels), _format_value(child.get()))]
+
+
+class Gauge(Counter):
+    _type = 'gauge'
+
+
+class _Histogram(object):
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        """Returns a context manager that observes the duration of its
+        with block in seconds."""
+        return _Timer(self)
+
+    def get(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Timer(object):
+    # a class instead of contextlib.contextmanager, which is several
+    # times slower
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = timeit.default_timer()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._histogram.observe(timeit.default_timer() - self._start)
+
+
+class Histogram(_Metric):
+    _type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        super(Histogram, self).__init__(name, documentation, labelnames)
+
+    def _create_child(self):
+        return _Histogram(self._buckets)
+
+    def _render_child(self, labels, child):
+        counts, total = child.get()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float('inf'),), counts):
+            cumulative += count
+            bucket_labels = labels + [('le', _format_value(bound))]
+            lines.append('{0}_bucket{1} {2}'.format(
+                self.name, _format_labels(bucket_labels), cumulative))
+        lines.append('{0}_sum{1} {2}'.format(
+            self.name, _format_labels(labels), _format_value(total)))
+        lines.append('{0}_count{1} {2}'.format(
+            self.name, _format_labels(labels), cumulative))
+        return lines
+
+
+class Registry(object):
+    """A collection of metrics that are exported together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=LATENCY_BUCKETS):
+        return self.register(
+            Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,89 @@
+import threading
+
+import numpy as np
+from foolbox.models import Model
+
+
+class MockModel(Model):
+    """A nearest neighbour model for testing attacks locally.
+
+    An image is classified like the closest reference sample if it is
+    closer than threshold, otherwise it is misclassified as the label
+    of the closest sample plus 30, i.e. an adversarial must be at least
+    threshold away from its original. For targeted attacks, the roles
+    are swapped so that an attack succeeds by moving the image far
+    enough away.
+
+    The distances to all samples are computed for the whole batch with
+    a single matrix product using precomputed squared norms.
+
+    Parameters
+    ----------
+    samples : list of (`numpy.ndarray`, int)
+        The reference images (64x64x3, values between 0 and 255) and
+        their labels, e.g. as returned by get_test_data.
+    mode : str
+        'untargeted' or 'targeted'.
+    threshold : float
+        The distance (with values between 0 and 255) below which an
+        image is classified like its closest sample.
+    pixels : int
+        Only the first pixels values of every flattened image are
+        compared, or all values if None.
+    batch_size : int
+        The number of images compared to all samples at once, which
+        bounds the memory used for large batches.
+
+    """
+
+    def __init__(self, samples, mode='untargeted', threshold=50.,
+                 pixels=1000, batch_size=256):
+        super(MockModel, self).__init__(bounds=(0, 255),
+                                        channel_axis=3,
+                                        preprocessing=(0, 1))
+        assert mode in ['untargeted', 'targeted']
+        images = np.stack([image for image, _ in samples])
+        self._samples = images.reshape(
+            (len(images), -1))[:, :pixels].astype(np.float64)
+        self._squared_norms = np.einsum(
+            'ij,ij->i', self._samples, self._samples)
+        self._labels = np.array([label for _, label in samples])
+        self._untargeted = mode == 'untargeted'
+        self._threshold = threshold
+        self._pixels = pixels
+        self._batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def num_classes(self):
+        return 200
+
+    def predictions(self, image):
+        return self.batch_predictions(image[np.newaxis])[0]
+
+    def batch_predictions(self, images):
+        """Returns the labels (not logits) of the images, every image
+        counts as one call."""
+        with self._lock:
+            self.calls += len(images)
+
+        images = images.reshape((len(images), -1))[:, :self._pixels]
+        labels = np.empty(len(images), dtype=self._labels.dtype)
+        for start in range(0, len(images), self._batch_size):
+            batch = images[start:start + self._batch_size].astype(np.float64)
+            # |x - s|^2 = |x|^2 - 2 x.s + |s|^2
+            squared = np.dot(batch, self._samples.T)
+            squared *= -2
+            squared += self._squared_norms
+            squared += np.einsum('ij,ij->i', batch, batch)[:, np.newaxis]
+
+            nearest = np.argmin(squared, axis=1)
+            close = squared[np.arange(len(batch)), nearest] \
+                < self._threshold ** 2
+            correct = close if self._untargeted else ~close
+
+            batch_labels = self._labels[nearest]
+            labels[start:start + len(batch)] = np.where(
+                correct, batch_labels, (batch_labels + 30) % 200)
+        return labels
@@ -1,7 +1,13 @@
-import crowdai_api
+import atexit
+import json
+import os
+import threading
+from collections import OrderedDict
 
 from enum import Enum
 
+from .logger import logger
+
 
 class ModelNotifications:
     TYPE = "AVC.MODEL"
@@ -21,14 +27,159 @@ class GeneralNotifications:
     ASSESTION_FAILURE = "AVC.ASSESTION_FAILURE"
 
 
+class CrowdAiSink(object):
+    """Delivers events to the crowdAI backend using a single, long-lived
+    events client."""
+
+    def __init__(self):
+        self._events = None
+
+    def send(self, event_type, message, payload, blocking):
+        if self._events is None:
+            # imported on first use, it takes long to import
+            import crowdai_api
+            self._events = crowdai_api.events.CrowdAIEvents()
+        self._events.register_event(event_type, message, payload, blocking)
+
+
+class FileSink(object):
+    """Appends events as json lines to a local file."""
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def send(self, event_type, message, payload, blocking):
+        line = json.dumps({
+            'event_type': event_type,
+            'message': message,
+            'payload': payload,
+            'blocking': blocking,
+        })
+        with self._lock:
+            with open(self._path, 'a') as f:
+                f.write(line + '\n')
+
+
+class MemorySink(object):
+    """Keeps events in a list, e.g. for tests."""
+
+    def __init__(self):
+        self.events = []
+
+    def send(self, event_type, message, payload, blocking):
+        self.events.append((event_type, message, payload, blocking))
+
+
+class NotificationDispatcher(object):
+    """Delivers events to a sink in a background thread.
+
+    Identical events that are still waiting to be delivered are coalesced
+    into a single event whose payload contains the number of occurrences
+    as 'count'. Blocking events are delivered in the calling thread after
+    all pending events have been delivered.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self._pending = OrderedDict()
+        self._delivering = 0
+        self._condition = threading.Condition()
+
+        thread = threading.Thread(target=self._run, args=())
+        thread.daemon = True
+        thread.start()
+
+    def send(self, event_type, message, payload, blocking=False):
+        if blocking:
+            self.flush()
+            self.sink.send(event_type, message, payload, blocking)
+            return
+
+        key = (event_type, message, json.dumps(payload, sort_keys=True))
+        with self._condition:
+            if key in self._pending:
+                self._pending[key][3] += 1
+            else:
+                self._pending[key] = [event_type, message, payload, 1]
+            self._condition.notify_all()
+
+    def flush(self):
+        """Blocks until all pending events have been delivered."""
+        with self._condition:
+            while self._pending or self._delivering:
+                self._condition.wait()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                _, event = self._pending.popitem(last=False)
+                self._delivering += 1
+
+            event_type, message, payload, count = event
+            if count > 1:
+                payload = dict(payload, count=count)
+            try:
+                self.sink.send(event_type, message, payload, False)
+            except Exception as e:
+                # notifications must never break the model or the attack
+                logger.error('could not deliver notification %s: %s',
+                             event_type, e)
+            finally:
+                with self._condition:
+                    self._delivering -= 1
+                    self._condition.notify_all()
+
+
 class CrowdAiNotifier():
 
+    _dispatcher = None
+    _dispatcher_pid = None
+    _dispatcher_lock = threading.Lock()
+
+    @staticmethod
+    def dispatcher():
+        """Returns the dispatcher of all notifications of this process.
+
+        Notifications are delivered to the crowdAI backend, or appended
+        to the file given by the NOTIFICATION_FILE environment variable,
+        unless another sink has been set.
+        """
+        with CrowdAiNotifier._dispatcher_lock:
+            # the delivery thread does not survive a fork
+            if CrowdAiNotifier._dispatcher_pid != os.getpid():
+                filename = os.getenv('NOTIFICATION_FILE')
+                if filename is not None:
+                    sink = FileSink(filename)
+                else:
+                    sink = CrowdAiSink()
+                dispatcher = NotificationDispatcher(sink)
+                atexit.register(dispatcher.flush)
+                CrowdAiNotifier._dispatcher = dispatcher
+                CrowdAiNotifier._dispatcher_pid = os.getpid()
+            return CrowdAiNotifier._dispatcher
+
+    @staticmethod
+    def set_sink(sink):
+        """Replaces the sink notifications are delivered to, e.g. by a
+        FileSink or MemorySink for local testing."""
+        dispatcher = CrowdAiNotifier.dispatcher()
+        dispatcher.flush()
+        dispatcher.sink = sink
+
+    @staticmethod
+    def flush():
+        """Blocks until all pending notifications have been delivered."""
+        CrowdAiNotifier.dispatcher().flush()
+
     @staticmethod
     def _send_notification(event_type, message, payload={}, blocking=False):
-        crowdai_events = crowdai_api.events.CrowdAIEvents()
         default_payload = {"challenge_id": "NIPS18_AVC"}
         default_payload.update(payload)
-        crowdai_events.register_event(event_type, message, payload, blocking)
+        CrowdAiNotifier.dispatcher().send(
+            event_type, message, default_payload, blocking)
 
     # ~~~~~~~~~~~~~~~~ ATTACK NOTIFICATIONS ~~~~~~~~~~~~~~~~
     @staticmethod
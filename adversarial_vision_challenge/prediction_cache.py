@@ -0,0 +1,100 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+
+
+def image_digest(image):
+    """Returns a digest of the bytes of a quantized (uint8) image."""
+    return hashlib.sha1(image.tobytes()).digest()
+
+
+class PredictionCache(object):
+    """A thread-safe LRU cache that maps image digests to predictions.
+
+    Entries can be added to a group, e.g. the file name of the image an
+    attack is working on, and groups can be cleared independently.
+
+    Parameters
+    ----------
+    max_entries : int
+        The maximum number of cached predictions.
+    max_bytes : int
+        The maximum approximate memory used by keys and values, or None
+        for no limit.
+
+    """
+
+    def __init__(self, max_entries=100000, max_bytes=None):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._groups = defaultdict(set)
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Returns the cached prediction or None."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            # reinsert to mark it as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, group=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            size = sys.getsizeof(key) + sys.getsizeof(value)
+            self._entries[key] = (value, group, size)
+            self._groups[group].add(key)
+            self._bytes += size
+
+            while len(self._entries) > self._max_entries or (
+                    self._max_bytes is not None
+                    and self._bytes > self._max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        value, group, size = self._entries.pop(key)
+        self._groups[group].discard(key)
+        if not self._groups[group]:
+            del self._groups[group]
+        self._bytes -= size
+
+    def clear(self, group=None):
+        """Removes all entries of the given group, or all entries if no
+        group is given."""
+        with self._lock:
+            if group is None:
+                self._entries.clear()
+                self._groups.clear()
+                self._bytes = 0
+                return
+            for key in list(self._groups.get(group, ())):
+                self._remove(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / float(lookups) if lookups else 0.,
+            }
@@ -0,0 +1,119 @@
+import cProfile
+import marshal
+import os
+import pstats
+import threading
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class RequestProfiler(object):
+    """Profiles sampled requests with cProfile and aggregates the results.
+
+    Every sample_every-th request is profiled, in addition to the
+    requests requested with capture. The aggregated statistics have the
+    format written by cProfile, so they can be loaded with pstats.Stats or
+    tools like snakeviz.
+
+    Parameters
+    ----------
+    sample_every : int
+        Profiles one in this many requests, or only captured requests
+        if 0.
+    output_file : str
+        If given, the aggregated statistics are written to this file
+        after every profiled request.
+
+    """
+
+    def __init__(self, sample_every=0, output_file=None):
+        self._sample_every = sample_every
+        self._output_file = output_file
+
+        self._lock = threading.Lock()
+        # held while a request is profiled, only one profiler can be
+        # active at a time (enforced since Python 3.12)
+        self._profiling = threading.Lock()
+        self._requests = 0
+        self._capture = 0
+        self._stats = None
+        self.profiled = 0
+
+    def capture(self, n):
+        """Discards the statistics collected so far and profiles the next
+        n requests."""
+        with self._lock:
+            self._stats = None
+            self.profiled = 0
+            self._capture = n
+
+    def run(self, function, *args, **kwargs):
+        """Calls the function, profiling it if the request is sampled.
+        Sampled requests are not profiled while another request is."""
+        sampled = self._sample()
+        if not sampled:
+            return function(*args, **kwargs)
+        if not self._profiling.acquire(False):
+            if sampled == 'capture':
+                # profile the next request instead
+                with self._lock:
+                    self._capture += 1
+            return function(*args, **kwargs)
+
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._add(profile)
+        finally:
+            self._profiling.release()
+
+    def _sample(self):
+        with self._lock:
+            self._requests += 1
+            if self._capture > 0:
+                self._capture -= 1
+                return 'capture'
+            return self._sample_every > 0 \
+                and self._requests % self._sample_every == 0
+
+    def _add(self, profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.profiled += 1
+            if self._output_file is not None:
+                self._write(self._output_file)
+
+    def _write(self, path):
+        # written to a temporary file first, so that readers never
+        # see a partially written file
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        self._stats.dump_stats(tmp_path)
+        os.rename(tmp_path, path)
+
+    def dumps(self):
+        """Returns the aggregated statistics in the format of the files
+        written by cProfile, or None if no request has been profiled."""
+        with self._lock:
+            if self._stats is None:
+                return None
+            return marshal.dumps(self._stats.stats)
+
+    def summary(self, limit=30, sort='cumulative'):
+        """Returns the functions that took the most time as text."""
+        stream = StringIO()
+        with self._lock:
+            if self._stats is None:
+                return 'no requests profiled yet\n'
+            self._stats.stream = stream
+            self._stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
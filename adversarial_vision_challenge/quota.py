@@ -0,0 +1,101 @@
+import json
+import multiprocessing
+import os
+
+from .logger import logger
+
+
+class SharedQuota(object):
+    """A prediction quota that is shared by all threads and all worker
+    processes of the model server.
+
+    Every image counts as one prediction. Requests that would exceed the
+    quota are rejected as a whole and do not consume any predictions.
+
+    The counters live in shared memory, so the quota must be created
+    before the worker processes are forked.
+
+    If a checkpoint file is given, the number of used predictions is
+    restored from it and written to it whenever another checkpoint_every
+    predictions have been used. The checkpoint records checkpoint_every
+    more predictions than have been used (at most the limit), so a
+    server that crashes and restarts can lose up to checkpoint_every
+    predictions but never grants more than the limit. Call checkpoint to
+    record the exact number, e.g. when the server stops.
+
+    Parameters
+    ----------
+    limit : float
+        The number of predictions that can be consumed.
+    checkpoint_file : str
+        The file the ledger is persisted to, or None.
+    checkpoint_every : int
+        The number of predictions after which the ledger is persisted.
+
+    """
+
+    def __init__(self, limit, checkpoint_file=None, checkpoint_every=1000):
+        self.limit = limit
+        self._checkpoint_file = checkpoint_file
+        self._checkpoint_every = checkpoint_every
+
+        used = 0
+        if checkpoint_file is not None and os.path.exists(checkpoint_file):
+            with open(checkpoint_file, 'r') as f:
+                used = json.load(f)['used']
+            logger.info('restored quota ledger from %s: %s of %s used',
+                        checkpoint_file, used, limit)
+
+        # all counters are protected by the lock of _used
+        self._used = multiprocessing.Value('d', used, lock=True)
+        self._rejected = multiprocessing.Value('d', 0, lock=False)
+        self._checkpointed = multiprocessing.Value('d', used, lock=False)
+
+    def consume(self, n=1):
+        """Atomically consumes n predictions if they are available and
+        returns the number of remaining predictions. If they are not
+        available, nothing is consumed and the returned number is
+        negative."""
+        with self._used.get_lock():
+            remaining = self.limit - self._used.value - n
+            if remaining < 0:
+                self._rejected.value += n
+                return remaining
+            self._used.value += n
+            if self._checkpoint_file is not None \
+                    and self._used.value > self._checkpointed.value:
+                self._checkpointed.value = min(
+                    self._used.value + self._checkpoint_every, self.limit)
+                self._write(self._checkpointed.value)
+            return remaining
+
+    def remaining(self):
+        return self.limit - self._used.value
+
+    def stats(self):
+        with self._used.get_lock():
+            return {
+                'limit': self.limit,
+                'used': self._used.value,
+                'remaining': self.limit - self._used.value,
+                'rejected': self._rejected.value,
+            }
+
+    def checkpoint(self):
+        """Writes the exact number of used predictions to the checkpoint
+        file."""
+        if self._checkpoint_file is None:
+            return
+        with self._used.get_lock():
+            self._checkpointed.value = self._used.value
+            self._write(self._used.value)
+
+    def _write(self, used):
+        # written to a temporary file first, so that a crash never
+        # leaves a truncated checkpoint behind
+        path = '{0}.{1}.tmp'.format(self._checkpoint_file, os.getpid())
+        with open(path, 'w') as f:
+            json.dump({'limit': self.limit, 'used': used}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(path, self._checkpoint_file)
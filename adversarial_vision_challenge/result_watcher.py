@@ -0,0 +1,188 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from .logger import logger
+
+# see inotify(7)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+# struct inotify_event without the variable length name
+_EVENT = struct.Struct('iIII')
+
+
+class ResultWatcher(object):
+    """Reports the files that are completely written to a folder, e.g.
+    the adversarials written by an attack.
+
+    On Linux, the folder is watched with inotify and a file is reported
+    as soon as the process writing it closes it (or renames it into the
+    folder), without scanning the folder. Elsewhere, or if inotify is not
+    available, the folder is scanned every poll_interval seconds and a
+    file is reported once its size and modification time did not change
+    between two scans.
+
+    Files that exist when the watcher is created are reported by the
+    first call to wait. A file that is written again is reported again.
+
+    Parameters
+    ----------
+    folder : str
+        The folder to watch.
+    poll_interval : float
+        The time in seconds between two scans if inotify is not used.
+    use_inotify : bool
+        Whether to use inotify if it is available.
+
+    """
+
+    def __init__(self, folder, poll_interval=0.5, use_inotify=True):
+        self.folder = folder
+        self._backend = None
+        if use_inotify:
+            try:
+                self._backend = _Inotify(folder)
+            except (OSError, AttributeError) as e:
+                logger.info('inotify not available, polling %s instead: %s',
+                            folder, e)
+        if self._backend is None:
+            self._backend = _Poller(folder, poll_interval)
+        self._pending = set(os.listdir(folder))
+
+    @property
+    def uses_inotify(self):
+        return isinstance(self._backend, _Inotify)
+
+    def wait(self, timeout=None):
+        """Waits until at least one file has been written or the timeout
+        (in seconds, None to wait forever) has passed.
+
+        Returns
+        -------
+        list of str
+            The sorted names of the files written since the last call,
+            empty if the timeout has passed.
+
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._pending:
+            remaining = None if deadline is None \
+                else max(0, deadline - time.time())
+            self._pending.update(self._backend.read(remaining))
+            if remaining == 0:
+                break
+        names, self._pending = sorted(self._pending), set()
+        return names
+
+    def close(self):
+        self._backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Inotify(object):
+
+    def __init__(self, folder):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify requires Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._folder = folder
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        path = folder.encode(sys.getfilesystemencoding())
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, path, mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, 'inotify_add_watch failed')
+
+    def read(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            if mask & _IN_Q_OVERFLOW:
+                # events were lost, report everything to be safe
+                logger.warning('inotify queue overflowed, rescanning %s',
+                               self._folder)
+                names.extend(os.listdir(self._folder))
+            elif length:
+                name = data[offset:offset + length].rstrip(b'\0')
+                names.append(name.decode(sys.getfilesystemencoding()))
+            offset += length
+        return names
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class _Poller(object):
+
+    def __init__(self, folder, poll_interval):
+        self._folder = folder
+        self._poll_interval = poll_interval
+        # the size and modification time of every file and whether it
+        # has been reported with them
+        self._files = {}
+        self._scan()
+        for name in self._files:
+            self._files[name] = (self._files[name][0], True)
+
+    def _scan(self):
+        names = []
+        for name in os.listdir(self._folder):
+            try:
+                stat = os.stat(os.path.join(self._folder, name))
+            except OSError:
+                continue
+            key = (stat.st_size, stat.st_mtime)
+            previous = self._files.get(name)
+            if previous is None or previous[0] != key:
+                self._files[name] = (key, False)
+            elif not previous[1]:
+                self._files[name] = (key, True)
+                names.append(name)
+        return names
+
+    def read(self, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            names = self._scan()
+            if names:
+                return names
+            delay = self._poll_interval
+            if deadline is not None:
+                delay = min(delay, deadline - time.time())
+                if delay <= 0:
+                    return []
+            time.sleep(delay)
+
+    def close(self):
+        pass
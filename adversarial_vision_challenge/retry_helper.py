@@ -1,6 +1,10 @@
-import requests
-from functools import wraps
+import random
+import threading
 import time
+from functools import wraps
+
+import requests
+
 from .logger import logger
 from .notifier import CrowdAiNotifier
 
@@ -9,20 +13,200 @@ class RetriesExceededError(Exception):
     pass
 
 
+class CircuitOpenError(RetriesExceededError):
+    """Raised without sending a request while the circuit breaker
+    considers the server unhealthy."""
+    pass
+
+
+def is_retryable_status(status_code):
+    """Returns True for server errors that may go away when retrying.
+    Client errors such as 429 Too Many Requests are not retried."""
+    return status_code >= 500
+
+
+class RetryPolicy(object):
+    """Decides how often and after which delay failed requests are retried.
+
+    The delay grows exponentially with every retry and is drawn
+    uniformly between 0 and the exponential delay ("full jitter"), so that
+    many clients don't retry in lockstep.
+
+    Parameters
+    ----------
+    retries : int
+        The maximum number of retries of a call.
+    base_delay : float
+        The maximum delay in seconds before the first retry.
+    multiplier : float
+        The factor by which the maximum delay grows with every retry.
+    max_delay : float
+        The upper limit of the delay in seconds.
+    deadline : float
+        The maximum time in seconds a call may take including all of its
+        retries, or None for no limit. No retry is started that could
+        not finish before the deadline. The timeout of every single
+        attempt is the timeout of the client.
+
+    """
+
+    def __init__(self, retries=3, base_delay=0.5, multiplier=2.,
+                 max_delay=10., deadline=60.):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def delay(self, retried):
+        """Returns the delay in seconds before the given retry."""
+        limit = min(self.max_delay,
+                    self.base_delay * self.multiplier ** (retried - 1))
+        return random.uniform(0, limit)
+
+
+class CircuitBreaker(object):
+    """Fails calls fast once the server is known to be unhealthy.
+
+    After failure_threshold consecutive failed attempts the breaker
+    opens and calls fail immediately with CircuitOpenError. After
+    reset_timeout seconds it becomes half open and lets a single attempt
+    through, which closes it again if it succeeds.
+
+    Parameters
+    ----------
+    failure_threshold : int
+        The number of consecutive failures that open the breaker.
+    reset_timeout : float
+        The time in seconds after which an open breaker lets an attempt
+        through.
+
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.time() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Returns True if an attempt may be sent to the server."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._opened_at is not None \
+                    or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.error('%s consecutive requests failed, failing '
+                                 'fast for %s s', self._failures,
+                                 self.reset_timeout)
+                self._opened_at = time.time()
+
+    def reset(self):
+        """Closes the breaker."""
+        self.record_success()
+
+
+def _is_retryable(error):
+    if isinstance(error, requests.exceptions.HTTPError) \
+            and error.response is not None:
+        return is_retryable_status(error.response.status_code)
+    return True
+
+
 def retryable(func, retries=3):
+    """Retries the decorated method if a request fails with a connection
+    error, a timeout or a server error. Other errors, e.g. 429 Too Many
+    Requests, are raised immediately.
+
+    The retry_policy and circuit_breaker attributes of the object the
+    method is called on are used if they are set, otherwise a default
+    RetryPolicy with the given number of retries.
+    """
+    default_policy = RetryPolicy(retries=retries)
+
     @wraps(func)
-    def retry(*args, **kwargs):
-        for retried in range(retries + 1):
-            if retried > 0:
-                logger.info('Retrying for the %s. time', retried)
-                time.sleep(3 * retried)
+    def retry(self, *args, **kwargs):
+        policy = getattr(self, 'retry_policy', None) or default_policy
+        breaker = getattr(self, 'circuit_breaker', None)
+
+        start = time.time()
+        retried = 0
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(
+                    'The server is unhealthy, not sending the request.')
             try:
-                return func(*args, **kwargs)
-            except requests.exceptions.RequestException:
-                pass
-        logger.error('Retried request for %s times. Giving up.', retried)
+                result = func(self, *args, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if _is_retryable(e):
+                    if breaker is not None:
+                        breaker.record_failure()
+                else:
+                    # the server answered, it just rejected the request
+                    if breaker is not None:
+                        breaker.record_success()
+                    raise
+            except RetriesExceededError:
+                # raised by a nested retryable call, which has already
+                # updated the breaker
+                raise
+            except Exception:
+                if breaker is not None:
+                    breaker.record_success()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+            retried += 1
+            delay = policy.delay(retried)
+            if retried > policy.retries or (
+                    policy.deadline is not None
+                    and time.time() + delay - start > policy.deadline):
+                break
+            logger.info('Retrying for the %s. time in %.1f s', retried, delay)
+            time.sleep(delay)
+
+        logger.error('Retried request for %s times. Giving up.', retried - 1)
         CrowdAiNotifier.retries_exceeded()
         raise RetriesExceededError(
-            "Failed already {0} times. No further retrying.".format(retries))
+            "Failed already {0} times. No further retrying.".format(retried))
 
     return retry
@@ -0,0 +1,259 @@
+"""Scores the adversarials written by an attack.
+
+The distance of an adversarial to its original is the L2 norm of their
+difference with pixel values scaled to [0, 1]. Missing or invalid
+adversarials get the worst case distance, the distance to the image
+that is farthest away from the original.
+"""
+import os
+from io import BytesIO
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+# adversarials closer than this to their original are not counted as
+# successful, see the mock model of the test scripts
+THRESHOLD = 50 / 255.
+
+
+def _npy_header():
+    f = BytesIO()
+    np.save(f, np.zeros((64, 64, 3), dtype=np.uint8))
+    return f.getvalue()[:-64 * 64 * 3]
+
+
+# the header np.save writes for 64x64x3 uint8 images
+_HEADER = _npy_header()
+
+
+def _load(path):
+    """Returns the image stored at path or None if it is not a valid
+    64x64x3 uint8 image."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except IOError:
+        return None
+
+    # parsing the header with np.load takes much longer than reading
+    # the file, so files with the usual header are decoded directly
+    if len(data) == len(_HEADER) + 64 * 64 * 3 and data.startswith(_HEADER):
+        return np.frombuffer(
+            data, dtype=np.uint8, offset=len(_HEADER)).reshape(64, 64, 3)
+
+    try:
+        image = np.load(BytesIO(data))
+    except (IOError, ValueError):
+        return None
+    if image.shape != (64, 64, 3) or image.dtype != np.uint8:
+        return None
+    return image
+
+
+def load_results(originals_folder, results_folder, file_names=None,
+                 workers=8):
+    """Loads originals and adversarials in parallel into stacked arrays.
+
+    Parameters
+    ----------
+    originals_folder : str
+        The directory containing the original .npy images.
+    results_folder : str
+        The directory containing the adversarials with the same names.
+    file_names : list of str
+        The files to load, by default all files in results_folder.
+    workers : int
+        The number of threads loading the files.
+
+    Returns
+    -------
+    list of str
+        The file names.
+    `numpy.ndarray`
+        The originals as Nx64x64x3 uint8 array.
+    `numpy.ndarray`
+        The adversarials as Nx64x64x3 uint8 array, all zeros where the
+        adversarial is invalid.
+    `numpy.ndarray`
+        A boolean array that is True where the adversarial is valid.
+
+    """
+    if file_names is None:
+        file_names = sorted(os.listdir(results_folder))
+    n = len(file_names)
+    originals = np.empty((n, 64, 64, 3), dtype=np.uint8)
+    adversarials = np.zeros((n, 64, 64, 3), dtype=np.uint8)
+    valid = np.zeros(n, dtype=bool)
+
+    def load(i):
+        name = file_names[i]
+        original = _load(os.path.join(originals_folder, name))
+        if original is None:
+            raise ValueError('invalid original image {0}'.format(name))
+        originals[i] = original
+        adversarial = _load(os.path.join(results_folder, name))
+        if adversarial is not None:
+            adversarials[i] = adversarial
+            valid[i] = True
+
+    pool = ThreadPool(workers)
+    try:
+        pool.map(load, range(n), chunksize=64)
+    finally:
+        pool.close()
+    return file_names, originals, adversarials, valid
+
+
+def distances(originals, adversarials, valid=None):
+    """Returns the distance of every adversarial to its original, or the
+    worst case distance where the adversarial is not valid.
+
+    The squared differences are summed exactly as integers, the result
+    equals the float64 computation of the test scripts up to rounding.
+    """
+    n = originals.shape[0]
+    # the size is given explicitly, -1 fails for empty arrays
+    size = int(np.prod(originals.shape[1:]))
+    originals = originals.reshape(n, size)
+    adversarials = adversarials.reshape(n, size)
+    if valid is None:
+        valid = np.ones(n, dtype=bool)
+
+    # the worst case of a pixel is 255 if it is smaller than 128, else 0
+    worst_case = (originals < 128) * np.uint8(255)
+    targets = np.where(valid[:, None], adversarials, worst_case)
+
+    # at most 12288 * 255 ** 2 per image, which fits into int32
+    differences = originals.astype(np.int32) - targets
+    squared = np.einsum('ij,ij->i', differences, differences)
+    return np.sqrt(squared) / 255.
+
+
+def score(file_names, distances, valid, threshold=THRESHOLD):
+    """Summarizes the distances like the test scripts.
+
+    Returns
+    -------
+    dict
+        The number of results, the number of successful adversarials
+        (distance above threshold), their median distance (NaN if there
+        are none) and a per-sample report.
+
+    """
+    successful = distances > threshold
+    median = float(np.median(distances[successful])) \
+        if successful.any() else float('nan')
+    return {
+        'results': len(file_names),
+        'successes': int(successful.sum()),
+        'median': median,
+        'samples': [
+            {'file_name': name, 'distance': float(d), 'valid': bool(v),
+             'success': bool(s)}
+            for name, d, v, s in zip(file_names, distances, valid, successful)
+        ],
+    }
+
+
+def score_attack(originals_folder, results_folder, workers=8,
+                 chunk_size=4096):
+    """Loads and scores all adversarials in results_folder, chunk by
+    chunk so that memory stays bounded for large result sets."""
+    file_names = sorted(os.listdir(results_folder))
+    all_distances = np.empty(len(file_names))
+    all_valid = np.empty(len(file_names), dtype=bool)
+    for start in range(0, len(file_names), chunk_size):
+        names, originals, adversarials, valid = load_results(
+            originals_folder, results_folder,
+            file_names[start:start + chunk_size], workers)
+        stop = start + len(names)
+        all_distances[start:stop] = distances(originals, adversarials, valid)
+        all_valid[start:stop] = valid
+    return score(file_names, all_distances, all_valid)
+
+
+class IncrementalScorer(object):
+    """Scores adversarials as they are written, e.g. as reported by a
+    ResultWatcher, so that the final report is available as soon as the
+    attack has finished.
+
+    Parameters
+    ----------
+    originals_folder : str
+        The directory containing the original .npy images.
+    results_folder : str
+        The directory containing the adversarials with the same names.
+    workers : int
+        The number of threads loading the files.
+    keep_adversarials : bool
+        Whether to keep the valid adversarials in memory, see
+        adversarials.
+
+    """
+
+    def __init__(self, originals_folder, results_folder, workers=8,
+                 keep_adversarials=False):
+        self._originals_folder = originals_folder
+        self._results_folder = results_folder
+        self._workers = workers
+        self._keep_adversarials = keep_adversarials
+        # the distance of every scored adversarial and whether it is valid
+        self._scored = {}
+        self._adversarials = {}
+
+    def __len__(self):
+        return len(self._scored)
+
+    def _score(self, file_names):
+        names, originals, adversarials, valid = load_results(
+            self._originals_folder, self._results_folder, list(file_names),
+            min(self._workers, len(file_names)))
+        scored = zip(names, distances(originals, adversarials, valid), valid)
+        return [(name, (d, v)) for name, d, v in scored], adversarials
+
+    def add(self, file_names):
+        """Scores the given adversarials, replacing earlier scores of
+        adversarials that have been written again."""
+        if not file_names:
+            return
+        scored, adversarials = self._score(file_names)
+        for (name, (d, v)), adversarial in zip(scored, adversarials):
+            self._scored[name] = (d, v)
+            if self._keep_adversarials:
+                if v:
+                    self._adversarials[name] = adversarial
+                else:
+                    self._adversarials.pop(name, None)
+
+    def successes(self, threshold=THRESHOLD):
+        """Returns the number of successful adversarials so far."""
+        return sum(d > threshold for d, _ in self._scored.values())
+
+    def adversarials(self):
+        """Returns the names and the stacked valid adversarials scored so
+        far, if keep_adversarials is set."""
+        file_names = sorted(self._adversarials)
+        adversarials = np.empty((len(file_names), 64, 64, 3), dtype=np.uint8)
+        for i, name in enumerate(file_names):
+            adversarials[i] = self._adversarials[name]
+        return file_names, adversarials
+
+    def report(self, file_names=None, threshold=THRESHOLD):
+        """Returns the report of score for the given adversarials, by
+        default all adversarials scored so far. Adversarials that have
+        not been scored are scored now, missing ones get the worst case
+        distance."""
+        scored = self._scored
+        if file_names is None:
+            file_names = sorted(scored)
+        else:
+            unscored = [name for name in file_names if name not in scored]
+            if unscored:
+                scored = dict(scored)
+                scored.update(self._score(unscored)[0])
+        scored = [scored[name] for name in file_names]
+        return score(
+            file_names,
+            np.array([d for d, _ in scored], dtype=np.float64),
+            np.array([v for _, v in scored], dtype=bool),
+            threshold)
@@ -3,23 +3,32 @@ from __future__ import print_function
 
 import inspect
 import os
+import signal
+import socket
+import threading
 from functools import wraps
 from io import BytesIO
 import timeit
 
-import bson
 import numpy as np
-from flask import Flask, Response, request
+from flask import Flask, Response, jsonify, request
 from PIL import Image
 
 # from werkzeug.exceptions import BadRequest
 from werkzeug.exceptions import TooManyRequests
+from werkzeug.serving import WSGIRequestHandler, make_server
 
 from . import __version__
 from .logger import logger
 from .notifier import CrowdAiNotifier
 from .common import _assert
 from .interaction_verifier import InteractionVerifier
+from .batch_scheduler import BatchScheduler
+from .quota import SharedQuota
+from .prediction_cache import PredictionCache, image_digest
+from .metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .profiler import RequestProfiler
+from . import wire_codecs
 
 
 # the number of max requests to predict for this model run
@@ -27,7 +36,12 @@ from .interaction_verifier import InteractionVerifier
 # NUM_IMAGES -> Number of Images in the Test Set
 # Quota of 1000 calls per Image
 # MaxPredictions = 1000 * num_images
-number_of_max_predictions = (float(os.environ.get('NUM_IMAGES', 100)) * 1000)
+# QUOTA_CHECKPOINT_FILE -> persists the used quota across restarts
+quota = SharedQuota(float(os.environ.get('NUM_IMAGES', 100)) * 1000,
+                    checkpoint_file=os.environ.get('QUOTA_CHECKPOINT_FILE'))
+
+# the pid of the main process if this process is a forked worker
+_parent_pid = None
 
 
 def model_server(model):
@@ -41,18 +55,163 @@ def model_server(model):
         The TCP port used by the HTTP server. Defaults to the MODEL_PORT environment
         variable or 8989 if not set.
 
+    Concurrent requests to /predict can be combined into batch predictions
+    by setting the MICRO_BATCHING_MAX_SIZE environment variable to the
+    maximum batch size. Requests then wait at most MICRO_BATCHING_MAX_DELAY
+    seconds (default: 0.005) for other requests to join their batch.
+
+    Setting PREDICTION_CACHE_SIZE to a value larger than 0 caches up to
+    that many predictions, so that the model is not run again for images
+    it has already classified. The memory used by the cache can be limited
+    with PREDICTION_CACHE_BYTES. Cached predictions still count towards
+    the quota. Only enable the cache for deterministic models.
+
+    Requests are handled in separate threads. Setting MODEL_SERVER_WORKERS
+    to a value larger than 1 additionally forks that many worker processes
+    that share the port and the prediction quota. The model is created
+    before forking, so this only works with models that can be used in
+    forked processes (e.g. models that do not hold a CUDA context yet).
+
+    If QUOTA_CHECKPOINT_FILE is set, the used prediction quota is persisted
+    to that file, so that a restarted server continues with the remaining
+    quota. The quota can be queried at /quota.
+
+    The latency of every phase of a request, request and error counters
+    and the remaining quota are exported at /metrics in the Prometheus
+    text format. Each worker process reports its own metrics.
+
+    Before the server reports to be ready at /ready, the model is warmed
+    up with MODEL_WARMUP_ROUNDS (default: 1) dummy predictions of a single
+    image and of batches of the sizes in MODEL_WARMUP_BATCH_SIZES
+    (comma-separated, by default the micro batching size if enabled).
+    Predictions requested earlier wait for the warm-up. The time until
+    the server was ready is logged and reported at /ready and /metrics.
+
+    Setting PROFILE_REQUESTS enables profiling: every PROFILE_REQUESTS-th
+    prediction request (none if 0) is profiled with cProfile. The
+    aggregated statistics are available at /profile, as text or with
+    ?format=pstats in the format of cProfile, and are written to
+    PROFILE_OUTPUT_FILE if set. /profile/capture?requests=N discards them
+    and profiles the next N requests.
+
     """
 
     port = int(os.environ.get('MODEL_PORT', 8989))
+    workers = int(os.environ.get('MODEL_SERVER_WORKERS', 1))
 
-    app = Flask(__name__)
-    cs_interaction_verifier = InteractionVerifier()
-
-    # disable verbose flask loggig
-    import logging
-    log = logging.getLogger('werkzeug')
-    log.setLevel(logging.ERROR)
-
+    try:
+        if workers > 1:
+            _serve_forked(model, port, workers)
+            return
+
+        app = _create_app(model)
+
+        logger.info('starting server on port {}'.format(port))
+        app.run(host='0.0.0.0', port=port, use_reloader=False,
+                threaded=True, request_handler=_KeepAliveRequestHandler)
+    finally:
+        quota.checkpoint()
+
+
+class _KeepAliveRequestHandler(WSGIRequestHandler):
+    # HTTP/1.1 lets clients reuse their connection for subsequent requests,
+    # which requires a threaded server so that open connections don't block
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        WSGIRequestHandler.setup(self)
+        # headers and body are written separately, without TCP_NODELAY
+        # the body would wait for the delayed ACK of the client
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def _serve_forked(model, port, workers):
+    """Serves the model from pre-forked worker processes that accept
+    connections on a shared socket. Workers that die are restarted, but
+    if a worker dies before it started serving, the server is stopped."""
+
+    # fails here instead of in every worker
+    _check_model(model)
+
+    # started before forking so that the workers share its state
+    # and only this process verifies the client interaction
+    InteractionVerifier()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('0.0.0.0', port))
+    sock.listen(128)
+
+    children = {}
+    stopping = []
+
+    def fork_worker():
+        global _parent_pid
+        parent_pid = os.getpid()
+        # the worker writes to the pipe once it is ready to serve
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            _parent_pid = parent_pid
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.close(ready_read)
+            try:
+                server = make_server(
+                    '0.0.0.0', port, _create_app(model), threaded=True,
+                    request_handler=_KeepAliveRequestHandler,
+                    fd=sock.fileno())
+                os.write(ready_write, b'1')
+                os.close(ready_write)
+                server.serve_forever()
+            except BaseException:
+                logger.exception('worker %s failed', os.getpid())
+            finally:
+                os._exit(1)
+        os.close(ready_write)
+        children[pid] = ready_read
+
+    def terminate(signum, frame):
+        stopping.append(signum)
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, terminate)
+
+    logger.info('starting {} workers on port {}'.format(workers, port))
+    for _ in range(workers):
+        fork_worker()
+
+    failed = None
+    while children:
+        pid, status = os.wait()
+        ready_read = children.pop(pid, None)
+        if ready_read is None:
+            continue
+        # the write end is closed, so this does not block
+        started = os.read(ready_read, 1) == b'1'
+        os.close(ready_read)
+        if stopping:
+            continue
+        if not started:
+            # restarting it would most likely fail again
+            logger.error('worker %s exited with status %s before it started '
+                         'serving, stopping the server', pid, status)
+            failed = pid
+            terminate(signal.SIGTERM, None)
+            continue
+        logger.error('worker %s exited with status %s, restarting it',
+                     pid, status)
+        fork_worker()
+
+    sock.close()
+    if failed is not None:
+        raise RuntimeError(
+            'model server worker {0} failed to start'.format(failed))
+
+
+def _check_model(model):
+    """Checks the channel axis and the bounds of the model and returns
+    its channel axis."""
     channel_axis = model.channel_axis()
     _assert(channel_axis in [1, 3], "model channel axis should be either 1 or 3")
 
@@ -65,19 +224,143 @@ def model_server(model):
     _assert(bounds == (0, 255), (
         'bounds must be (0, 255), update your model or use the preprocessing '
         'argument of foolbox model wrappers'))
+    return channel_axis
+
+
+def _create_app(model):
+    """Creates the Flask app that serves the given model."""
+
+    app = Flask(__name__)
+    cs_interaction_verifier = InteractionVerifier()
+
+    # disable verbose flask loggig
+    import logging
+    log = logging.getLogger('werkzeug')
+    log.setLevel(logging.ERROR)
+
+    channel_axis = _check_model(model)
+
+    def _batch_predictions(images):
+        if hasattr(model, 'batch_predictions'):
+            return model.batch_predictions(images)
+        return [model.predictions(image) for image in images]
+
+    scheduler = None
+    max_batch_size = int(os.environ.get('MICRO_BATCHING_MAX_SIZE', 0))
+    if max_batch_size > 1:
+        max_delay = float(os.environ.get('MICRO_BATCHING_MAX_DELAY', 0.005))
+        scheduler = BatchScheduler(
+            _batch_predictions, max_batch_size, max_delay)
+
+    cache = None
+    cache_size = int(os.environ.get('PREDICTION_CACHE_SIZE', 0))
+    if cache_size > 0:
+        cache_bytes = os.environ.get('PREDICTION_CACHE_BYTES')
+        cache = PredictionCache(
+            cache_size, int(cache_bytes) if cache_bytes else None)
+
+    registry = Registry()
+    phase_seconds = registry.histogram(
+        'avc_phase_seconds',
+        'Time spent in each phase of handling prediction requests.',
+        ['phase'])
+    phases = dict((phase, phase_seconds.labels(phase)) for phase in [
+        'decode', 'validate', 'preprocess', 'predict', 'encode'])
+    requests_total = registry.counter(
+        'avc_requests_total', 'Prediction requests received.', ['endpoint'])
+    errors_total = registry.counter(
+        'avc_request_errors_total',
+        'Prediction requests that failed, except for rejected ones.',
+        ['endpoint'])
+    rejected_total = registry.counter(
+        'avc_too_many_requests_total',
+        'Prediction requests rejected because the quota was exceeded.',
+        ['endpoint'])
+    in_flight = registry.gauge(
+        'avc_requests_in_flight', 'Prediction requests being handled.',
+        ['endpoint'])
+    quota_remaining = registry.gauge(
+        'avc_quota_remaining', 'Predictions left in the quota.')
+    quota_remaining.set_function(lambda: quota.remaining())
+    cold_start_seconds = registry.gauge(
+        'avc_cold_start_seconds',
+        'Time from creating the server until the model was warmed up.')
+
+    warm_up = _WarmUp(
+        model, channel_axis, _batch_predictions,
+        rounds=int(os.environ.get('MODEL_WARMUP_ROUNDS', 1)),
+        batch_sizes=_parse_batch_sizes(os.environ.get(
+            'MODEL_WARMUP_BATCH_SIZES',
+            str(max_batch_size) if max_batch_size > 1 else '')))
+    warm_up.start(on_ready=cold_start_seconds.set)
+
+    profiler = None
+    if os.environ.get('PROFILE_REQUESTS') is not None:
+        profiler = RequestProfiler(
+            int(os.environ['PROFILE_REQUESTS']),
+            os.environ.get('PROFILE_OUTPUT_FILE'))
+
+    def _profile(view):
+        """Profiles the decorated view if profiling is enabled."""
+        if profiler is None:
+            return view
+
+        @wraps(view)
+        def wrapper():
+            return profiler.run(view)
+        return wrapper
+
+    def _track(endpoint):
+        """Counts the requests handled by the decorated view."""
+        requests_counter = requests_total.labels(endpoint)
+        errors_counter = errors_total.labels(endpoint)
+        rejected_counter = rejected_total.labels(endpoint)
+        in_flight_gauge = in_flight.labels(endpoint)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper():
+                requests_counter.inc()
+                in_flight_gauge.inc()
+                try:
+                    return view()
+                except TooManyRequests:
+                    rejected_counter.inc()
+                    raise
+                except Exception:
+                    errors_counter.inc()
+                    raise
+                finally:
+                    in_flight_gauge.dec()
+            return wrapper
+        return decorator
 
     def _predict(image):
-        _assert(isinstance(image, np.ndarray), "input image should be an numpy array")
-        _assert(image.shape == (64, 64, 3), "input image should be of size 64x64x3")
-        _assert(image.dtype == np.uint8, "image should be of type np.uint8, but got: %s" % image.dtype)
+        with phases['validate'].time():
+            _assert(isinstance(image, np.ndarray), "input image should be an numpy array")
+            _assert(image.shape == (64, 64, 3), "input image should be of size 64x64x3")
+            _assert(image.dtype == np.uint8, "image should be of type np.uint8, but got: %s" % image.dtype)
+
+        if cache is None:
+            return _classify(image)
+
+        key = image_digest(image)
+        prediction = cache.get(key)
+        if prediction is None:
+            prediction = _classify(image)
+            cache.put(key, prediction)
+        return prediction
 
+    def _classify(image):
         # models (should) expect float32 arrays
-        image = image.astype(np.float32)
-
-        if channel_axis == 1:
-            image = np.transpose(image, [2, 0, 1])
+        with phases['preprocess'].time():
+            image = _to_float32(image, channel_axis)
 
-        prediction = model.predictions(image)
+        with phases['predict'].time():
+            if scheduler is not None:
+                prediction = scheduler.predict(image)
+            else:
+                prediction = model.predictions(image)
 
         if isinstance(prediction, np.ndarray) and prediction.size > 1:
             _assert(prediction.size == 200, "prediction.size should be 200, but got: %s" % prediction.size)
@@ -86,7 +369,52 @@ def model_server(model):
         _assert(0 <= prediction < 200, "prediction should be a value between 0 and 200, but got: %s" % prediction)
         return prediction
 
-    _predict = _wrap(_predict, ['prediction'])
+    def _predict_batch(images):
+        with phases['validate'].time():
+            _assert(isinstance(images, np.ndarray), "input images should be an numpy array")
+            _assert(images.ndim == 4 and images.shape[1:] == (64, 64, 3),
+                    "input images should be of size Nx64x64x3, but got: %s" % (images.shape,))
+            _assert(images.shape[0] > 0, "input images should contain at least one image")
+            _assert(images.dtype == np.uint8, "images should be of type np.uint8, but got: %s" % images.dtype)
+
+        # every image in the batch counts as one request
+        if not _is_evaluator_request(request):
+            _check_rate_limitation(images.shape[0])
+
+        if cache is None:
+            return _classify_batch(images)
+
+        keys = [image_digest(image) for image in images]
+        predictions = [cache.get(key) for key in keys]
+        missing = [i for i, prediction in enumerate(predictions)
+                   if prediction is None]
+        if missing:
+            for i, prediction in zip(missing, _classify_batch(images[missing])):
+                cache.put(keys[i], prediction)
+                predictions[i] = prediction
+        return predictions
+
+    def _classify_batch(images):
+        # models (should) expect float32 arrays
+        with phases['preprocess'].time():
+            images = _to_float32(images, channel_axis)
+
+        with phases['predict'].time():
+            predictions = np.asarray(_batch_predictions(images))
+
+        if predictions.ndim == 2:
+            _assert(predictions.shape[1] == 200, "predictions.shape[1] should be 200, but got: %s" % predictions.shape[1])
+            predictions = np.argmax(predictions, axis=1)
+        _assert(predictions.shape == (images.shape[0],),
+                "expected one prediction per image, but got: %s" % (predictions.shape,))
+
+        predictions = [int(prediction) for prediction in predictions]
+        for prediction in predictions:
+            _assert(0 <= prediction < 200, "prediction should be a value between 0 and 200, but got: %s" % prediction)
+        return predictions
+
+    _predict = _wrap(_predict, ['prediction'], phases)
+    _predict_batch = _wrap(_predict_batch, ['predictions'], phases)
 
     @app.route("/")
     def main():  # pragma: no cover
@@ -99,9 +427,17 @@ def model_server(model):
         v = __version__
         return Response(str(v), mimetype='text/plain')
 
+    @app.route("/codecs", methods=['GET'])
+    def codecs():
+        return Response(
+            ','.join(wire_codecs.available_codecs()), mimetype='text/plain')
+
     @app.route("/predict", methods=['POST'])
+    @_track('predict')
+    @_profile
     def predict():
         cs_interaction_verifier.mark()
+        warm_up.wait()
         eval_request = _is_evaluator_request(request)
         if not eval_request:
             _check_rate_limitation()
@@ -111,13 +447,130 @@ def model_server(model):
         logger.debug('prediction took: %s s', (end - start))
         return prediction
 
+    @app.route("/predict_batch", methods=['POST'])
+    @_track('predict_batch')
+    @_profile
+    def predict_batch():
+        cs_interaction_verifier.mark()
+        warm_up.wait()
+        start = timeit.default_timer()
+        predictions = _predict_batch(request)
+        end = timeit.default_timer()
+        logger.debug('batch prediction took: %s s', (end - start))
+        return predictions
+
+    @app.route("/ready", methods=['GET'])
+    def ready():
+        status = warm_up.status()
+        return jsonify(status), 200 if status['ready'] else 503
+
+    @app.route("/metrics", methods=['GET'])
+    def metrics():
+        return Response(registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+    @app.route("/quota", methods=['GET'])
+    def remaining_quota():
+        return jsonify(quota.stats())
+
+    if profiler is not None:
+        @app.route("/profile", methods=['GET'])
+        def profile():
+            if request.args.get('format') == 'pstats':
+                stats = profiler.dumps()
+                if stats is None:
+                    return Response('no requests profiled yet\n', status=404,
+                                    mimetype='text/plain')
+                return Response(stats, mimetype='application/octet-stream')
+            return Response(profiler.summary(), mimetype='text/plain')
+
+        @app.route("/profile/capture", methods=['GET'])
+        def profile_capture():
+            n = request.args.get('requests', 1, type=int)
+            profiler.capture(n)
+            return Response('profiling the next {0} requests\n'.format(n),
+                            mimetype='text/plain')
+
+    if scheduler is not None:
+        @app.route("/batching_stats", methods=['GET'])
+        def batching_stats():
+            return jsonify(scheduler.stats())
+
+    if cache is not None:
+        @app.route("/cache_stats", methods=['GET'])
+        def cache_stats():
+            return jsonify(cache.stats())
+
     @app.route("/shutdown", methods=['GET'])
     def shutdown():
         _shutdown_server()
         return 'Shutting down ...'
 
-    logger.info('starting server on port {}'.format(port))
-    app.run(host='0.0.0.0', port=port, use_reloader=False)
+    @app.teardown_request
+    def drain_request(exception):
+        # requests rejected before their body was read (e.g. because the
+        # quota is exceeded) would otherwise leave the body on the
+        # kept-alive connection, where it would be parsed as the next request
+        request.get_data()
+
+    return app
+
+
+class _WarmUp(object):
+    """Runs dummy predictions in a background thread, so that lazy
+    initialization (graph building, autotuning, loading weights) happens
+    before the server reports that it is ready."""
+
+    def __init__(self, model, channel_axis, batch_predictions, rounds=1,
+                 batch_sizes=()):
+        self._model = model
+        self._channel_axis = channel_axis
+        self._batch_predictions = batch_predictions
+        self._rounds = rounds
+        self._batch_sizes = batch_sizes
+
+        self._created = timeit.default_timer()
+        self._ready = threading.Event()
+        self.cold_start_seconds = None
+
+    def start(self, on_ready=None):
+        thread = threading.Thread(target=self._run, args=(on_ready,))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, on_ready):
+        try:
+            image = np.zeros((64, 64, 3), dtype=np.uint8)
+            for _ in range(self._rounds):
+                self._model.predictions(
+                    _to_float32(image, self._channel_axis))
+                for batch_size in self._batch_sizes:
+                    images = np.zeros((batch_size, 64, 64, 3), dtype=np.uint8)
+                    self._batch_predictions(
+                        _to_float32(images, self._channel_axis))
+        except Exception as e:
+            # the real requests will fail (and report) the same way
+            logger.error('warming up the model failed: %s', e)
+        finally:
+            self.cold_start_seconds = timeit.default_timer() - self._created
+            logger.info('model server ready after %.3f s',
+                        self.cold_start_seconds)
+            if on_ready is not None:
+                on_ready(self.cold_start_seconds)
+            self._ready.set()
+
+    def wait(self):
+        """Blocks until the warm-up is finished."""
+        self._ready.wait()
+
+    def status(self):
+        return {
+            'ready': self._ready.is_set(),
+            'cold_start_seconds': self.cold_start_seconds,
+        }
+
+
+def _parse_batch_sizes(value):
+    return [int(size) for size in value.split(',') if size.strip()]
 
 
 def _is_evaluator_request(request):
@@ -128,29 +581,49 @@ def _is_evaluator_request(request):
             and http_header == eval_secret
 
 
-def _check_rate_limitation():
-    global number_of_max_predictions
-    logger.debug('Number of remaining max requests: %s',
-                 number_of_max_predictions)
-    number_of_max_predictions -= 1
-    if (number_of_max_predictions < 0):
+def _to_float32(images, channel_axis):
+    """Converts one or more uint8 images of size 64x64x3 to a contiguous
+    float32 array with the channel axis of the model in a single pass."""
+    shape = images.shape
+    if channel_axis == 1:
+        shape = shape[:-3] + (shape[-1],) + shape[-3:-1]
+    result = np.empty(shape, dtype=np.float32)
+    if channel_axis == 1:
+        np.moveaxis(result, -3, -1)[...] = images
+    else:
+        result[...] = images
+    return result
+
+
+def _check_rate_limitation(n=1):
+    remaining = quota.consume(n)
+    logger.debug('Number of remaining max requests: %s', remaining)
+    if (remaining < 0):
         logger.error('Maximal number of prediction requests exceeded: %s',
-                     number_of_max_predictions)
+                     remaining)
         CrowdAiNotifier.too_many_requests()
         raise TooManyRequests(
             'Maximal number of prediction requests exceeded: {0}'.format(
-                number_of_max_predictions))
+                remaining))
 
 
 def _shutdown_server():
+    if _parent_pid is not None:  # pragma: no cover
+        # stop all workers, not just this one, but only after this
+        # worker has sent its response
+        timer = threading.Timer(0.5, os.kill, (_parent_pid, signal.SIGTERM))
+        timer.daemon = True
+        timer.start()
+        return
     func = request.environ.get('werkzeug.server.shutdown')
     if func is None:  # pragma: no cover
         raise RuntimeError('Not running with the Werkzeug Server')
     func()
 
 
-def _wrap(function, output_names):
-    """A decorator that converts data between flask and python / numpy"""
+def _wrap(function, output_names, phases):
+    """A decorator that converts data between flask and python / numpy
+    and records the time spent decoding and encoding in phases."""
 
     try:
         # Python 3
@@ -173,14 +646,15 @@ def _wrap(function, output_names):
             print('is_json', request.is_json)
             print('data length', len(request.data))
 
-        content_type = request.headers.get('content-type', '').lower()
+        codec = wire_codecs.get_codec(request.headers.get('content-type'))
 
-        if content_type == 'application/bson':
-            bson_args = bson.loads(request.data)
-            bson_args = _decode_arrays(bson_args)
+        if codec is not None:
+            data = request.data
+            with phases['decode'].time():
+                encoded_args = codec.decode(data)
 
         else:  # pragma: no cover
-            bson_args = {}
+            encoded_args = {}
 
         args = {}
 
@@ -193,7 +667,7 @@ def _wrap(function, output_names):
                 return
             args[name] = value
 
-        for name, value in bson_args.items():
+        for name, value in encoded_args.items():
             add_argument(name, value)
 
         for name, value in request.args.items():  # pragma: no cover
@@ -217,33 +691,12 @@ def _wrap(function, output_names):
         else:
             assert len(result) == len(output_names)
             result = dict(zip(output_names, result))
-        result = _encode_arrays(result)
-        result = bson.dumps(result)
-        return Response(result, mimetype='application/bson')
+        # answer with the codec the client accepts, by default
+        # with the codec of the request
+        codec = wire_codecs.negotiate(
+            request.headers.get('Accept'), codec or wire_codecs.BSON)
+        with phases['encode'].time():
+            result = codec.encode(result)
+        return Response(result, mimetype=codec.content_type)
 
     return wrapper
-
-
-def _encode_arrays(d):
-    for key in list(d.keys()):
-        if isinstance(d[key], np.ndarray):
-            array = d[key]
-            d[key] = {
-                'type': 'array',
-                'shape': array.shape,
-                'dtype': array.dtype.str,
-                'data': array.tobytes(),
-            }
-    return d
-
-
-def _decode_arrays(d):
-    for key in list(d.keys()):
-        if hasattr(d[key], 'get') \
-                and d[key].get('type') == 'array':
-            shape = d[key]['shape']
-            dtype = d[key]['dtype']
-            data = d[key]['data']
-            array = np.frombuffer(data, dtype=dtype).reshape(shape)
-            d[key] = array
-    return d
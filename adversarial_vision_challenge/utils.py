@@ -1,14 +1,17 @@
+import atexit
 import os
+import threading
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
-import yaml
 
-from .client import TinyImageNetBSONModel
 from .logger import logger
 from .notifier import CrowdAiNotifier
 from .common import check_image
-
-from adversarial_vision_challenge.retry_helper import RetriesExceededError
+from .image_store import ImageStore
+from .adversarial_writer import AdversarialWriter
 
 
 def _load_img(path):
@@ -22,78 +25,189 @@ def _load_img(path):
     return image
 
 
-def _read_image(file_name):
+def _read_image(file_name, dtype=np.float32):
     """
-        Returns a tuple of image as numpy array and label as int,
-        given the csv row.
+        Returns the image with the given file name in the input folder
+        as numpy array of the given dtype.
     """
     input_folder = os.getenv('INPUT_IMG_PATH')
     img_path = os.path.join(input_folder, file_name)
     image = _load_img(img_path)
     assert image.dtype == np.uint8
-    image = image.astype(np.float32)
-    assert image.dtype == np.float32
+    if dtype != np.uint8:
+        image = image.astype(dtype)
     return image
 
 
-def read_images():
+def _load_yaml(ymlfile):
+    """
+        Parses the yaml file, using the C implementation of the
+        parser if available.
     """
-        Returns a list containing tuples of images as numpy arrays
-        and the correspoding label.
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    return yaml.load(ymlfile, Loader=loader)
+
+
+def read_images(dtype=np.float32, prefetch=8, workers=4):
+    """
+        Returns an iterator over tuples of file names, images as numpy
+        arrays and the correspoding label.
         In case of an untargeted attack the label is the ground truth label.
         In case of a targeted attack the label is the target label.
+
+        Images are loaded on demand: up to prefetch images are read
+        ahead by a pool of background threads. dtype can be np.float32
+        or np.uint8.
+        If the input folder contains an image store (see
+        avc-pack-images), images and labels are read from the store.
     """
+    assert dtype in (np.float32, np.uint8)
+    input_folder = os.getenv('INPUT_IMG_PATH')
+    if ImageStore.exists(input_folder):
+        return _iterate_store(ImageStore(input_folder), dtype)
+
     filepath = os.getenv('INPUT_YML_PATH')
     with open(filepath, 'r') as ymlfile:
-        data = yaml.load(ymlfile)
+        data = _load_yaml(ymlfile)
+
+    return _iterate_images(data, dtype, prefetch, workers)
+
+
+def _iterate_store(store, dtype):
+    for file_name, image, label in store:
+        yield file_name, np.array(image, dtype=dtype), label
 
-    return [(key, _read_image(key), data[key]) for key in data.keys()]
+
+def _iterate_images(labels, dtype, prefetch, workers):
+    if prefetch <= 0:
+        for key, label in labels.items():
+            yield key, _read_image(key, dtype), label
+        return
+
+    pool = ThreadPool(workers)
+    try:
+        pending = deque()
+        for key, label in labels.items():
+            pending.append(
+                (key, pool.apply_async(_read_image, (key, dtype)), label))
+            if len(pending) > prefetch:
+                key, image, label = pending.popleft()
+                yield key, image.get(), label
+        while pending:
+            key, image, label = pending.popleft()
+            yield key, image.get(), label
+    finally:
+        pool.terminate()
 
 
 def store_adversarial(file_name, adversarial):
     """
         Given the filename, stores the adversarial as .npy file.
+        The file is written in the background, attack_complete waits
+        until all adversarials have been written.
     """
     if adversarial is not None:
         adversarial = check_image(adversarial)
+        # the attack might modify the array before it has been written
+        adversarial = np.array(adversarial)
 
     output_folder = os.getenv('OUTPUT_ADVERSARIAL_PATH')
     path = os.path.join(output_folder, file_name)
     path_without_extension = os.path.splitext(path)[0]
-    np.save(path_without_extension, adversarial)
-    CrowdAiNotifier.store_adversarial(file_name)
+    _get_writer().store(path_without_extension, file_name, adversarial)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AdversarialWriter()
+            # don't lose pending adversarials of attacks that
+            # never call attack_complete
+            atexit.register(_flush_at_exit)
+        return _writer
+
+
+def _flush_at_exit():
+    # the writer sends notifications while it drains, so the dispatcher
+    # is flushed afterwards (its own exit hook may already have run)
+    try:
+        _writer.flush()
+    finally:
+        CrowdAiNotifier.flush()
 
 
 def attack_complete():
     """
-        Send a notificaton to the crowd-ai backend that the attack has
+        Waits until all adversarials have been written and then sends
+        a notificaton to the crowd-ai backend that the attack has
         successfully completed.
     """
+    _get_writer().flush()
     CrowdAiNotifier.attack_complete()
 
 
-def _wait_for_server_start(model, retried=0):
-    logger.info('{0} for model server to start...'.format('Wating' if retried == 0 else 'Still waiting'))
-    version = ''
-    try:
-        version = model.server_version()
-    except RetriesExceededError:
-        if 'NIPS 2018' not in version:
-            if retried < 3:
-                _wait_for_server_start(model, retried + 1)
-            else:
-                logger.error("=======> Can't reach model server: %s.", model.base_url)
-
-
-def load_model():
+def _wait_for_server_start(model, timeout=120, poll_interval=0.05):
+    """
+        Polls the model server until it is ready to serve predictions,
+        for at most timeout seconds. While the server warms up its model,
+        it is polled every poll_interval seconds, while it can't be
+        reached, with the backoff of failed requests.
+    """
+    # requests and the client are only imported by attacks
+    import requests
+    from .retry_helper import RetryPolicy
+
+    logger.info('Wating for model server to start...')
+    policy = model.retry_policy or RetryPolicy()
+    deadline = time.time() + timeout
+    retried = 0
+    warming_up = False
+    while True:
+        delay = None
+        try:
+            r = model.requests.get(model._url('/ready'), timeout=10)
+            # servers without /ready are ready once they answer
+            if r.ok or r.status_code == 404:
+                if model.circuit_breaker is not None:
+                    model.circuit_breaker.reset()
+                return
+            if r.status_code == 503:
+                if not warming_up:
+                    logger.info('Model server is warming up...')
+                    warming_up = True
+                delay = poll_interval
+        except requests.exceptions.RequestException:
+            pass
+
+        if delay is None:
+            retried += 1
+            delay = policy.delay(retried)
+            logger.info('Still waiting for model server to start...')
+        delay = min(delay, deadline - time.time())
+        if delay <= 0:
+            logger.error("=======> Can't reach model server: %s.",
+                         model.base_url)
+            return
+        time.sleep(delay)
+
+
+def load_model(cache_size=0):
     """
         Returns an BSONModel reading the server URI and post from
-        environment variables.
+        environment variables. If cache_size is larger than 0, the
+        model caches up to that many predictions.
     """
     model_port = os.getenv('MODEL_PORT', 8989)
     model_server = os.getenv('MODEL_SERVER', 'localhost')
     model_url = 'http://{0}:{1}'.format(model_server, model_port)
-    model = TinyImageNetBSONModel(model_url)
+    from .client import TinyImageNetBSONModel
+    model = TinyImageNetBSONModel(model_url, cache_size=cache_size)
     _wait_for_server_start(model)
     return model
 
@@ -101,11 +215,7 @@ def load_model():
 def get_test_data():
     """
         Returns a list with entries (image, label) over test samples.
+        The images are read-only views into the packed test images.
     """
-    basepath = os.path.join(os.path.dirname(__file__), 'test_images/')
-    label_file = os.path.join(basepath, 'labels.yml')
-    with open(label_file, 'r') as ymlfile:
-        files2labels = yaml.load(ymlfile)
-
-    return [(_load_img(os.path.join('test_images', filename)), label)
-            for filename, label in sorted(files2labels.items())]
+    store = ImageStore(os.path.join(os.path.dirname(__file__), 'test_images'))
+    return [(image, label) for _, image, label in store]
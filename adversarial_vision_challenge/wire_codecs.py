@@ -0,0 +1,179 @@
+"""Codecs that convert the request and response dictionaries exchanged
+between client and model server to bytes.
+
+The codec of a request is selected by its content-type header, the codec
+of the response by the Accept header. The server lists the codecs it
+supports at /codecs, fastest first.
+"""
+import struct
+from collections import OrderedDict
+
+import numpy as np
+
+
+class BSONCodec(object):
+    """Encodes dictionaries as BSON documents in which numpy arrays are
+    stored as sub-documents with shape, dtype and raw data."""
+
+    content_type = 'application/bson'
+
+    def encode(self, data):
+        # imported on first use, so that importing the codecs is cheap
+        import bson
+        encoded = {}
+        for key in list(data.keys()):
+            if isinstance(data[key], np.ndarray):
+                array = data[key]
+                encoded[key] = {
+                    'type': 'array',
+                    'shape': array.shape,
+                    'dtype': array.dtype.str,
+                    'data': array.tobytes(),
+                }
+            else:
+                encoded[key] = data[key]
+        return bson.dumps(encoded)
+
+    def decode(self, payload):
+        import bson
+        decoded = bson.loads(payload)
+        for key in list(decoded.keys()):
+            if hasattr(decoded[key], 'get') \
+                    and decoded[key].get('type') == 'array':
+                shape = decoded[key]['shape']
+                dtype = decoded[key]['dtype']
+                data = decoded[key]['data']
+                decoded[key] = np.frombuffer(data, dtype=dtype).reshape(shape)
+        return decoded
+
+
+class RawArrayCodec(object):
+    """Encodes dictionaries of numpy arrays, ints and lists of ints with a
+    fixed-size binary header per value followed by the raw array data.
+
+    Arrays are decoded without copying, they are read-only views into
+    the received payload.
+
+    The payload starts with the magic bytes and the number of values,
+    followed by the values, each consisting of the length of its name,
+    its kind (array, int or list), the length of its dtype string, its
+    number of dimensions, the name, the dtype string, the shape and the
+    data.
+    """
+
+    content_type = 'application/x-avc-raw'
+
+    _MAGIC = b'AVC1'
+    _HEADER = struct.Struct('<4sH')
+    _VALUE = struct.Struct('<BcBB')
+    _DIMENSION = struct.Struct('<I')
+
+    _ARRAY = b'a'
+    _INT = b'i'
+    _LIST = b'l'
+
+    def encode(self, data):
+        chunks = [self._HEADER.pack(self._MAGIC, len(data))]
+        for key, value in data.items():
+            if isinstance(value, np.ndarray):
+                kind = self._ARRAY
+                array = np.ascontiguousarray(value)
+            elif isinstance(value, list):
+                kind = self._LIST
+                array = np.asarray(value, dtype=np.int64)
+            else:
+                kind = self._INT
+                array = np.asarray(int(value), dtype=np.int64)
+            name = key.encode('utf-8')
+            dtype = array.dtype.str.encode('ascii')
+            chunks.append(self._VALUE.pack(
+                len(name), kind, len(dtype), array.ndim))
+            chunks.append(name)
+            chunks.append(dtype)
+            chunks.extend(self._DIMENSION.pack(n) for n in array.shape)
+            chunks.append(array.reshape(-1).data)
+        return b''.join(chunks)
+
+    def decode(self, payload):
+        view = memoryview(payload)
+        magic, count = self._HEADER.unpack_from(view, 0)
+        if magic != self._MAGIC:
+            raise ValueError('payload is not encoded with {0}'.format(
+                self.content_type))
+        offset = self._HEADER.size
+
+        decoded = {}
+        for _ in range(count):
+            name_length, kind, dtype_length, ndim = self._VALUE.unpack_from(
+                view, offset)
+            offset += self._VALUE.size
+            name = view[offset:offset + name_length].tobytes().decode('utf-8')
+            offset += name_length
+            dtype = np.dtype(view[offset:offset + dtype_length].tobytes()
+                             .decode('ascii'))
+            offset += dtype_length
+            shape = tuple(self._DIMENSION.unpack_from(
+                view, offset + i * self._DIMENSION.size)[0]
+                for i in range(ndim))
+            offset += ndim * self._DIMENSION.size
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            array = np.frombuffer(
+                view[offset:offset + nbytes], dtype=dtype).reshape(shape)
+            offset += nbytes
+
+            if kind == self._ARRAY:
+                decoded[name] = array
+            elif kind == self._LIST:
+                decoded[name] = [int(x) for x in array]
+            else:
+                decoded[name] = int(array)
+        return decoded
+
+
+_codecs = OrderedDict()
+
+
+def register_codec(codec):
+    """Makes a codec available to client and server. Codecs registered
+    first are preferred."""
+    _codecs[codec.content_type] = codec
+
+
+def get_codec(content_type):
+    """Returns the codec for the given content-type header value
+    or None if there is no such codec."""
+    if not content_type:
+        return None
+    content_type = content_type.split(';')[0].strip().lower()
+    return _codecs.get(content_type)
+
+
+def available_codecs():
+    """Returns the content types of all codecs, fastest first."""
+    return list(_codecs.keys())
+
+
+def select_codec(content_types):
+    """Returns the first available codec of the given content types,
+    or the BSON codec if none of them is available."""
+    for content_type in content_types:
+        codec = get_codec(content_type)
+        if codec is not None:
+            return codec
+    return BSON
+
+
+def negotiate(accept, default):
+    """Returns the first codec listed in the given Accept header value,
+    or the default codec if none of them is available."""
+    for content_type in (accept or '').split(','):
+        codec = get_codec(content_type)
+        if codec is not None:
+            return codec
+    return default
+
+
+register_codec(RawArrayCodec())
+register_codec(BSONCodec())
+
+BSON = get_codec(BSONCodec.content_type)
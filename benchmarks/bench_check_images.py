@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Compares the throughput of validating and quantizing a batch of
+float32 images with check_image per image and with check_images."""
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import numpy as np
+
+from adversarial_vision_challenge.common import check_image, check_images
+
+
+def measure(function, repeat):
+    # best of 5 runs, in seconds per call
+    times = timeit.repeat(function, number=repeat, repeat=5)
+    return min(times) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print('{:<24} {:>6} {:>16}'.format('kernel', 'batch', 'images / s'))
+    for batch_size in [1, 100, 1000]:
+        images = np.random.uniform(
+            0, 255, size=(batch_size, 64, 64, 3)).astype(np.float32)
+        out = np.empty(images.shape, dtype=np.uint8)
+
+        def per_image():
+            np.stack([check_image(image) for image in images])
+
+        def batch():
+            check_images(images, out=out)
+
+        for name, function in [('check_image', per_image),
+                               ('check_images', batch)]:
+            seconds = measure(function, args.repeat)
+            print('{:<24} {:>6} {:>16.0f}'.format(
+                name, batch_size, batch_size / seconds))
+
+
+if __name__ == '__main__':
+    main()
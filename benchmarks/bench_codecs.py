@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Measures the CPU time each wire codec spends per request on the
+client (encode request, decode response) and on the server (decode
+request, encode response)."""
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import numpy as np
+
+from adversarial_vision_challenge import wire_codecs
+
+
+def measure(function, repeat):
+    # best of 5 runs, in microseconds per call
+    times = timeit.repeat(function, number=repeat, repeat=5)
+    return min(times) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    print('{:<24} {:>6} {:>12} {:>12}'.format(
+        'codec', 'batch', 'client [us]', 'server [us]'))
+    for batch_size in [1, 100]:
+        if batch_size == 1:
+            request = {'image': np.random.randint(
+                0, 256, size=(64, 64, 3)).astype(np.uint8)}
+            response = {'prediction': 22}
+        else:
+            request = {'images': np.random.randint(
+                0, 256, size=(batch_size, 64, 64, 3)).astype(np.uint8)}
+            response = {'predictions': [22] * batch_size}
+
+        for content_type in wire_codecs.available_codecs():
+            codec = wire_codecs.get_codec(content_type)
+            encoded_request = codec.encode(request)
+            encoded_response = codec.encode(response)
+
+            def client():
+                codec.encode(request)
+                codec.decode(encoded_response)
+
+            def server():
+                codec.decode(encoded_request)
+                codec.encode(response)
+
+            print('{:<24} {:>6} {:>12.1f} {:>12.1f}'.format(
+                content_type, batch_size,
+                measure(client, args.repeat), measure(server, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
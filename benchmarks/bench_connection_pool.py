@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Compares the per-query latency of TinyImageNetBSONModel with and
+without keep-alive connections against a local model server."""
+from __future__ import print_function
+
+import argparse
+import os
+import socket
+import threading
+import timeit
+
+import numpy as np
+import requests
+
+from adversarial_vision_challenge import model_server
+from adversarial_vision_challenge.client import TinyImageNetBSONModel
+from adversarial_vision_challenge.utils import _wait_for_server_start
+
+
+class Model(object):
+    def channel_axis(self):
+        return 3
+
+    def bounds(self):
+        return (0, 255)
+
+    def predictions(self, image):
+        return 22
+
+
+def _get_free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def start_server():
+    port = _get_free_port()
+    os.environ['MODEL_PORT'] = str(port)
+    thread = threading.Thread(target=model_server, args=(Model(),))
+    thread.daemon = True
+    thread.start()
+    return 'http://localhost:{}'.format(port)
+
+
+def measure(model, image, queries):
+    latencies = []
+    for _ in range(queries):
+        start = timeit.default_timer()
+        model(image)
+        latencies.append(timeit.default_timer() - start)
+    return np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    url = start_server()
+    image = np.random.uniform(0, 255, size=(64, 64, 3)).astype(np.float32)
+
+    # before: every query goes through the module-level requests API
+    # and opens a new connection
+    before = TinyImageNetBSONModel(url)
+    before.close()
+    before.requests = requests
+    _wait_for_server_start(before)
+    before_ms = measure(before, image, args.queries)
+
+    with TinyImageNetBSONModel(url) as after:
+        after_ms = measure(after, image, args.queries)
+
+    print('{:<22} {:>10} {:>10} {:>10}'.format(
+        'ms per query', 'mean', 'p50', 'p99'))
+    for name, ms in [('new connection', before_ms),
+                     ('keep-alive pool', after_ms)]:
+        print('{:<22} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+            name, ms.mean(), np.percentile(ms, 50), np.percentile(ms, 99)))
+
+
+if __name__ == '__main__':
+    main()
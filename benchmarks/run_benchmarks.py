@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Runs the microbenchmarks of the client/server request pipeline.
+
+Every stage (wire codecs, image validation, the server's request
+handling and the client end-to-end against an in-process model server)
+is measured on its own, as well as the time it takes to import the
+package for an attack and for a model. The results can be written to a JSON file and
+compared against a saved baseline:
+
+    python benchmarks/run_benchmarks.py --output baseline.json
+    # ... change something ...
+    python benchmarks/run_benchmarks.py --compare baseline.json
+
+The exit code is 1 if the median latency of any benchmark grew by more
+than the tolerance.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import adversarial_vision_challenge
+from adversarial_vision_challenge import server, wire_codecs
+from adversarial_vision_challenge.client import TinyImageNetBSONModel
+from adversarial_vision_challenge.common import check_image, check_images
+from adversarial_vision_challenge.quota import SharedQuota
+from adversarial_vision_challenge.utils import _wait_for_server_start
+
+
+class Model(object):
+    """A trivial model like scripts/demo_numpy_model.py."""
+
+    def channel_axis(self):
+        return 1
+
+    def bounds(self):
+        return (0, 255)
+
+    def predictions(self, image):
+        return 22
+
+    def batch_predictions(self, images):
+        return np.full(len(images), 22)
+
+
+def _images(n, dtype=np.uint8):
+    np.random.seed(22)
+    return np.random.uniform(0, 255, size=(n, 64, 64, 3)).astype(dtype)
+
+
+def _get_free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def _start_server():
+    port = _get_free_port()
+    os.environ['MODEL_PORT'] = str(port)
+    thread = threading.Thread(target=server.model_server, args=(Model(),))
+    thread.daemon = True
+    thread.start()
+    return 'http://localhost:{}'.format(port)
+
+
+def codec_benchmarks():
+    benchmarks = []
+    for content_type in wire_codecs.available_codecs():
+        codec = wire_codecs.get_codec(content_type)
+        name = content_type.split('/')[-1]
+        for batch_size in [1, 100]:
+            if batch_size == 1:
+                data = {'image': _images(1)[0]}
+            else:
+                data = {'images': _images(batch_size)}
+            encoded = codec.encode(data)
+            benchmarks.append((
+                'codec.{}.encode[{}]'.format(name, batch_size),
+                lambda codec=codec, data=data: codec.encode(data)))
+            benchmarks.append((
+                'codec.{}.decode[{}]'.format(name, batch_size),
+                lambda codec=codec, encoded=encoded: codec.decode(encoded)))
+    return benchmarks
+
+
+def validation_benchmarks():
+    image = _images(1, np.float32)[0]
+    images = _images(100, np.float32)
+    out = np.empty(images.shape, dtype=np.uint8)
+    return [
+        ('check_image', lambda: check_image(image)),
+        ('check_images[100]', lambda: check_images(images, out=out)),
+    ]
+
+
+def server_benchmarks():
+    client = server._create_app(Model()).test_client()
+    codec = wire_codecs.get_codec('application/x-avc-raw')
+    headers = {'content-type': codec.content_type}
+    image = codec.encode({'image': _images(1)[0]})
+    images = codec.encode({'images': _images(100)})
+
+    def predict():
+        response = client.post('/predict', data=image, headers=headers)
+        assert response.status_code == 200
+
+    def predict_batch():
+        response = client.post('/predict_batch', data=images, headers=headers)
+        assert response.status_code == 200
+
+    return [
+        ('server.predict', predict),
+        ('server.predict_batch[100]', predict_batch),
+    ]
+
+
+def end_to_end_benchmarks():
+    url = _start_server()
+    model = TinyImageNetBSONModel(url)
+    _wait_for_server_start(model)
+    image = _images(1, np.float32)[0]
+    images = _images(100, np.float32)
+    return [
+        ('client.predict', lambda: model.predict(image)),
+        ('client.predict_batch[100]', lambda: model.predict_batch(images)),
+    ]
+
+
+def import_benchmarks():
+    # every call starts a new interpreter, so this includes its startup
+    statements = [
+        ('import.package', 'import adversarial_vision_challenge'),
+        ('import.attack', 'from adversarial_vision_challenge import '
+                          'load_model, read_images, store_adversarial'),
+        ('import.model',
+         'from adversarial_vision_challenge import model_server'),
+    ]
+    return [(name, lambda statement=statement: subprocess.check_call(
+        [sys.executable, '-c', statement])) for name, statement in statements]
+
+
+SUITES = [codec_benchmarks, validation_benchmarks, server_benchmarks,
+          end_to_end_benchmarks, import_benchmarks]
+
+
+def measure(function, duration):
+    """Calls the function repeatedly for about duration seconds and
+    returns its throughput, latency percentiles and the peak memory
+    allocated by a single call."""
+    for _ in range(3):
+        function()
+
+    latencies = []
+    end = timeit.default_timer() + duration
+    while True:
+        start = timeit.default_timer()
+        function()
+        stop = timeit.default_timer()
+        latencies.append(stop - start)
+        if stop > end and len(latencies) >= 10:
+            break
+    latencies = np.array(latencies) * 1e6
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'calls': len(latencies),
+        'ops_per_s': len(latencies) / (latencies.sum() / 1e6),
+        'p50_us': float(np.percentile(latencies, 50)),
+        'p99_us': float(np.percentile(latencies, 99)),
+        'alloc_peak_kib': peak / 1024.,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change of every benchmark and returns the names of
+    those whose median latency grew by more than tolerance. The median
+    is used because it is far less noisy than the throughput."""
+    regressions = []
+    print()
+    print('{:<32} {:>14} {:>14} {:>9}'.format(
+        'benchmark', 'baseline p50', 'p50 [us]', 'change'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['p50_us']
+        change = result['p50_us'] / before - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{:<32} {:>14.1f} {:>14.1f} {:>+8.1%}{}'.format(
+            name, before, result['p50_us'], change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--duration', type=float, default=1.,
+                        help='seconds per benchmark')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks containing this string')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--compare', help='a previous output to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='the tolerated relative increase of the median')
+    args = parser.parse_args()
+
+    # the benchmarks send far more requests than the default quota allows
+    server.quota = SharedQuota(float('inf'))
+
+    results = {}
+    print('{:<32} {:>12} {:>10} {:>10} {:>12}'.format(
+        'benchmark', 'ops/s', 'p50 [us]', 'p99 [us]', 'peak [KiB]'))
+    for suite in SUITES:
+        for name, function in suite():
+            if args.filter not in name:
+                continue
+            result = results[name] = measure(function, args.duration)
+            print('{:<32} {:>12.1f} {:>10.1f} {:>10.1f} {:>12.1f}'.format(
+                name, result['ops_per_s'], result['p50_us'],
+                result['p99_us'], result['alloc_peak_kib']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'version': adversarial_vision_challenge.__version__,
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'machine': platform.machine(),
+                    'time': time.time(),
+                },
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\n{} benchmarks regressed'.format(len(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import socket
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+# the async client requires Python 3.5
+if sys.version_info < (3, 5):
+    pytest.skip('requires Python 3.5', allow_module_level=True)
+asyncio = pytest.importorskip('asyncio')
+
+from adversarial_vision_challenge import model_server
+
+from test_server import NumpyModel, random_images
+
+
+def start_server(monkeypatch):
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('', 0))
+    port = s.getsockname()[1]
+    s.close()
+
+    monkeypatch.setenv('MODEL_PORT', str(port))
+    thread = threading.Thread(target=model_server, args=(NumpyModel(),))
+    thread.daemon = True
+    thread.start()
+
+    url = 'http://localhost:{}'.format(port)
+    for _ in range(50):
+        try:
+            requests.get(url)
+            break
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.1)
+    return url
+
+
+def test_predict_many(monkeypatch):
+    pytest.importorskip('aiohttp')
+    from adversarial_vision_challenge.async_client import \
+        AsyncTinyImageNetBSONModel
+
+    images = random_images(20)
+    model = AsyncTinyImageNetBSONModel(start_server(monkeypatch), max_concurrency=4)
+    loop = asyncio.new_event_loop()
+    try:
+        predictions = loop.run_until_complete(model.predict_many(images))
+        loop.run_until_complete(model.close())
+    finally:
+        loop.close()
+
+    assert predictions == [int(x) % 200 for x in images[:, 0, 0, 0]]
@@ -0,0 +1,117 @@
+import numpy as np
+
+from adversarial_vision_challenge import wire_codecs
+from adversarial_vision_challenge.client import TinyImageNetBSONModel
+from adversarial_vision_challenge.utils import _wait_for_server_start
+
+from test_server import create_client, random_images
+
+
+class Response(object):
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.ok = response.status_code < 400
+        self.content = response.data
+        self.headers = response.headers
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def raise_for_status(self):
+        assert self.ok
+
+
+class FlaskRequests(object):
+    """Sends the requests of a TinyImageNetBSONModel to a Flask test client."""
+
+    def __init__(self, client, unsupported=()):
+        self.client = client
+        self.unsupported = unsupported
+        self.paths = []
+
+    def _request(self, method, url, **kwargs):
+        path = url.replace('http://localhost:8989', '')
+        self.paths.append(path)
+        if path in self.unsupported:
+            path = '/unsupported'
+        return Response(method(path, **kwargs))
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        return self._request(self.client.post, url, headers=headers, data=data)
+
+    def get(self, url, timeout=None):
+        return self._request(self.client.get, url)
+
+
+def create_model(**kwargs):
+    unsupported = kwargs.pop('unsupported', ())
+    model = TinyImageNetBSONModel('http://localhost:8989', **kwargs)
+    model.requests = FlaskRequests(create_client(), unsupported)
+    return model
+
+
+def test_batch_predictions():
+    model = create_model(max_batch_size=3)
+    images = random_images(8).astype(np.float32)
+    predictions = model.batch_predictions(images)
+    assert predictions.shape == (8, 200)
+    assert (predictions.argmax(axis=1) == images[:, 0, 0, 0] % 200).all()
+    assert model.requests.paths == ['/codecs'] + ['/predict_batch'] * 3
+
+
+def test_codec_fallback():
+    model = create_model(unsupported=['/codecs'])
+    image = random_images(1)[0]
+    assert model(image) == image[0, 0, 0] % 200
+    assert model._codec is wire_codecs.BSON
+
+
+def test_batch_predictions_fallback():
+    model = create_model(unsupported=['/predict_batch'])
+    images = random_images(4)
+    predictions = model.batch_predictions(images)
+    assert (predictions.argmax(axis=1) == images[:, 0, 0, 0] % 200).all()
+    assert model.requests.paths == \
+        ['/codecs', '/predict_batch'] + ['/predict'] * 4
+
+
+def test_prediction_cache():
+    model = create_model(cache_size=100)
+    images = random_images(4).astype(np.float32)
+
+    model.set_source_image('a.npy')
+    first = model.predict(images[0])
+    # jitter that rounds to the same pixels is answered from the cache
+    assert model.predict(images[0] + 0.1) == first
+    assert model.requests.paths.count('/predict') == 1
+
+    model.set_source_image('b.npy')
+    batch = np.stack([images[0], images[1], images[1], images[2]])
+    predictions = model.batch_predictions(batch).argmax(axis=1)
+    assert list(predictions) == [int(x) % 200 for x in batch[:, 0, 0, 0]]
+    assert model.cache.stats()['entries'] == 3
+
+    model.clear_cache('b.npy')
+    assert model.cache.stats()['entries'] == 1
+    assert model.cache.stats()['hits'] == 2
+
+
+def test_quota():
+    model = create_model()
+    remaining = model.quota()['remaining']
+    model.predict_batch(random_images(3))
+    assert model.quota()['remaining'] == remaining - 3
+
+    model = create_model(unsupported=['/quota'])
+    assert model.quota() is None
+
+
+def test_wait_for_server_start():
+    model = create_model()
+    _wait_for_server_start(model, timeout=5)
+    assert model.requests.paths[-1] == '/ready'
+
+    model = create_model(unsupported=['/ready'])
+    _wait_for_server_start(model, timeout=5)
+    assert model.requests.paths == ['/ready']
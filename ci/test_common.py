@@ -0,0 +1,26 @@
+import numpy as np
+
+from adversarial_vision_challenge.common import check_image, check_images
+
+
+def test_check_images():
+    images = np.random.uniform(
+        -10, 265, size=(37, 64, 64, 3)).astype(np.float32)
+    images[3] = np.random.uniform(0, 255, size=(64, 64, 3))
+    images[5, 0, 0] = [0.5, 1.5, 254.5]
+    expected = np.stack([check_image(image) for image in images])
+
+    for out in [None, np.empty(images.shape, dtype=np.uint8)]:
+        result, clipped_low, clipped_high = check_images(
+            images, out=out, chunk_size=8)
+        assert result.dtype == np.uint8
+        assert result.tobytes() == expected.tobytes()
+        if out is not None:
+            assert result is out
+
+    assert (clipped_low == (images < 0).sum(axis=(1, 2, 3))).all()
+    assert (clipped_high == (images > 255).sum(axis=(1, 2, 3))).all()
+    assert clipped_low[3] == 0 and clipped_high[3] == 0
+
+    quantized = check_images(expected)[0]
+    assert quantized is expected
@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+
+def imported_modules(statement):
+    output = subprocess.check_output([sys.executable, '-c', (
+        '{}; import sys; print(",".join(sys.modules))').format(statement)])
+    return set(output.decode('utf-8').strip().split(','))
+
+
+def test_lazy_imports():
+    modules = imported_modules('import adversarial_vision_challenge')
+    assert not modules & set(['flask', 'foolbox', 'crowdai_api', 'bson'])
+
+    modules = imported_modules(
+        'from adversarial_vision_challenge import model_server')
+    assert 'flask' in modules
+    assert 'foolbox' not in modules
+
+    modules = imported_modules(
+        'import adversarial_vision_challenge as avc; avc.utils.load_model')
+    assert 'flask' not in modules
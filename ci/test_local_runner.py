@@ -0,0 +1,96 @@
+import sys
+
+from adversarial_vision_challenge.local_runner import run_local
+
+MODEL = '''
+from adversarial_vision_challenge import model_server
+
+
+class Model(object):
+    def channel_axis(self):
+        return 3
+
+    def bounds(self):
+        return (0, 255)
+
+    def predictions(self, image):
+        return 22
+
+
+model_server(Model())
+'''
+
+ATTACK = '''
+import os
+
+import numpy as np
+from adversarial_vision_challenge import load_model, read_images
+from adversarial_vision_challenge import store_adversarial, attack_complete
+
+model = load_model()
+for file_name, image, label in read_images():
+    model(image)
+    # the image farthest away for the first sample, the original for the
+    # second, nothing for the third and an invalid file for the last
+    if file_name == 'img0.npy':
+        store_adversarial(file_name, (255 * (image < 128)).astype(np.float32))
+    elif file_name == 'img1.npy':
+        store_adversarial(file_name, image)
+    elif file_name == 'img3.npy':
+        np.save(os.path.join(os.environ['OUTPUT_ADVERSARIAL_PATH'],
+                             file_name), image[:32])
+attack_complete()
+'''
+
+
+def test_run_local(tmpdir):
+    model_directory = tmpdir.mkdir('model')
+    model_directory.join('main.py').write(MODEL)
+    attack_directory = tmpdir.mkdir('attack')
+    attack_directory.join('main.py').write(ATTACK)
+
+    progress = []
+    command = '{0} main.py'.format(sys.executable)
+    result = run_local(
+        str(model_directory), str(attack_directory), samples=4,
+        work_dir=str(tmpdir.join('work')), model_command=command,
+        attack_command=command, timeout=60, progress=progress.append)
+
+    assert result['attack_exit_code'] == 0, open(result['attack_log']).read()
+    assert progress[-1] == 3
+
+    timings = result['timings']
+    assert 0 < timings['model_ready']
+    assert 0 < timings['first_query'] <= timings['attack']
+    assert 0 < timings['first_result'] <= timings['attack']
+    assert timings['attack'] < timings['total']
+
+    # the invalid file gets the worst case distance
+    score = result['score']
+    assert score['results'] == 3
+    assert score['successes'] == 2
+    assert [sample['file_name'] for sample in score['samples']] == [
+        'img0.npy', 'img1.npy', 'img3.npy']
+    assert [sample['valid'] for sample in score['samples']] == [
+        True, True, False]
+    assert score['samples'][1]['distance'] == 0
+    assert score['samples'][2]['success']
+    assert score['missing'] == ['img2.npy']
+
+
+def test_run_local_without_results(tmpdir):
+    model_directory = tmpdir.mkdir('model')
+    model_directory.join('main.py').write(MODEL)
+    attack_directory = tmpdir.mkdir('attack')
+
+    command = '{0} main.py'.format(sys.executable)
+    result = run_local(
+        str(model_directory), str(attack_directory), samples=2,
+        work_dir=str(tmpdir.join('work')), model_command=command,
+        attack_command='true', timeout=60)
+
+    assert result['attack_exit_code'] == 0
+    assert result['timings']['first_result'] is None
+    assert result['score']['results'] == 0
+    assert result['score']['successes'] == 0
+    assert result['score']['missing'] == ['img0.npy', 'img1.npy']
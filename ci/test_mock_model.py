@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from adversarial_vision_challenge.mock_model import MockModel
+
+
+def reference_prediction(samples, image, untargeted):
+    # the mock model of the test scripts before it was vectorized
+    S = np.stack([sample[0] for sample in samples]).reshape(
+        (len(samples), -1))[:, :1000]
+    distances = np.linalg.norm(S - image.flatten()[:1000][None], axis=1)
+    label = samples[np.argmin(distances)][1]
+    if (np.amin(distances) < 50) == untargeted:
+        return label
+    return (label + 30) % 200
+
+
+@pytest.mark.parametrize('mode', ['untargeted', 'targeted'])
+def test_mock_model(mode):
+    np.random.seed(22)
+    samples = [(np.random.uniform(0, 255, (64, 64, 3)).astype(np.float32),
+                np.random.randint(200)) for _ in range(20)]
+    model = MockModel(samples, mode, batch_size=7)
+
+    # close to, far from and in between samples
+    images = np.stack([samples[i][0] + np.random.uniform(-3, 3, (64, 64, 3))
+                       for i in range(10)]
+                      + [samples[i][0] + 30 for i in range(10)]
+                      + [np.full((64, 64, 3), 128.)])
+    images = images.astype(np.float32)
+
+    expected = [reference_prediction(samples, image, mode == 'untargeted')
+                for image in images]
+    assert list(model.batch_predictions(images)) == expected
+    assert model.predictions(images[0]) == expected[0]
+    assert model.predictions(images[15]) == expected[15]
+    assert model.calls == len(images) + 2
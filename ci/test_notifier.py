@@ -0,0 +1,51 @@
+import json
+import threading
+
+from adversarial_vision_challenge.notifier import CrowdAiNotifier
+from adversarial_vision_challenge.notifier import FileSink, MemorySink
+from adversarial_vision_challenge.notifier import NotificationDispatcher
+
+
+class BlockingSink(MemorySink):
+
+    def __init__(self):
+        super(BlockingSink, self).__init__()
+        self.release = threading.Event()
+
+    def send(self, *args):
+        self.release.wait()
+        super(BlockingSink, self).send(*args)
+
+
+def test_coalescing():
+    sink = BlockingSink()
+    dispatcher = NotificationDispatcher(sink)
+    dispatcher.send('first', '', {})
+    for _ in range(1000):
+        dispatcher.send('failure', 'message', {'type': 'general'})
+    dispatcher.send('other', '', {})
+    sink.release.set()
+    dispatcher.send('complete', '', {}, blocking=True)
+
+    events = [event[0] for event in sink.events]
+    assert events == ['first', 'failure', 'other', 'complete']
+    assert sink.events[1][2] == {'type': 'general', 'count': 1000}
+    assert sink.events[3][3]
+
+
+def test_notifier_sink(tmpdir):
+    path = str(tmpdir.join('events.jsonl'))
+    sink = CrowdAiNotifier.dispatcher().sink
+    CrowdAiNotifier.set_sink(FileSink(path))
+    try:
+        CrowdAiNotifier.store_adversarial('img0.npy')
+        CrowdAiNotifier.attack_complete()
+    finally:
+        CrowdAiNotifier.set_sink(sink)
+
+    with open(path) as f:
+        events = [json.loads(line) for line in f]
+    assert [event['event_type'] for event in events] == [
+        'AVC.ATTACK.STORE_ADVERSARIAL', 'AVC.ATTACK.COMPLETE']
+    assert events[0]['payload']['filename'] == 'img0.npy'
+    assert events[0]['payload']['challenge_id'] == 'NIPS18_AVC'
@@ -0,0 +1,47 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from adversarial_vision_challenge.result_watcher import ResultWatcher
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_result_watcher(tmpdir, use_inotify):
+    folder = str(tmpdir)
+    np.save(os.path.join(folder, 'img0.npy'), np.zeros(3))
+
+    with ResultWatcher(folder, poll_interval=0.01,
+                       use_inotify=use_inotify) as watcher:
+        if use_inotify and sys.platform.startswith('linux'):
+            assert watcher.uses_inotify
+        else:
+            assert not watcher.uses_inotify
+
+        # existing files are reported first
+        assert watcher.wait(timeout=0) == ['img0.npy']
+        assert watcher.wait(timeout=0.05) == []
+
+        def write():
+            time.sleep(0.05)
+            for k in [1, 2]:
+                np.save(os.path.join(folder, 'img{}.npy'.format(k)),
+                        np.zeros(3))
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        names = set()
+        start = time.time()
+        while len(names) < 2 and time.time() - start < 5:
+            names.update(watcher.wait(timeout=1))
+        thread.join()
+        assert names == set(['img1.npy', 'img2.npy'])
+
+        # files renamed into the folder count as written
+        tmp_path = os.path.join(os.path.dirname(folder), 'img3.tmp.npy')
+        np.save(tmp_path, np.zeros(3))
+        os.rename(tmp_path, os.path.join(folder, 'img3.npy'))
+        assert watcher.wait(timeout=5) == ['img3.npy']
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+import requests
+
+from adversarial_vision_challenge.retry_helper import retryable, RetryPolicy
+from adversarial_vision_challenge.retry_helper import CircuitBreaker
+from adversarial_vision_challenge.retry_helper import CircuitOpenError
+from adversarial_vision_challenge.retry_helper import RetriesExceededError
+
+
+def http_error(status_code):
+    response = requests.models.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+class FlakyClient(object):
+    """Raises the given errors before it succeeds."""
+
+    def __init__(self, errors, breaker=None):
+        self.errors = list(errors)
+        self.calls = 0
+        self.retry_policy = RetryPolicy(retries=3, base_delay=0.)
+        self.circuit_breaker = breaker
+
+    @retryable
+    def get(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def test_retries_server_errors():
+    client = FlakyClient([requests.exceptions.ConnectionError(),
+                          http_error(503)])
+    assert client.get() == 'ok'
+    assert client.calls == 3
+
+    client = FlakyClient([http_error(500)] * 4)
+    with pytest.raises(RetriesExceededError):
+        client.get()
+    assert client.calls == 4
+
+
+def test_no_retries_for_client_errors():
+    client = FlakyClient([http_error(429)])
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get()
+    assert client.calls == 1
+
+
+def test_deadline():
+    client = FlakyClient([requests.exceptions.Timeout()] * 4)
+    client.retry_policy = RetryPolicy(base_delay=0.1, deadline=0.)
+    with pytest.raises(RetriesExceededError):
+        client.get()
+    assert client.calls == 1
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    client = FlakyClient([requests.exceptions.ConnectionError()] * 10,
+                         breaker)
+    with pytest.raises(CircuitOpenError):
+        client.get()
+    assert client.calls == 3
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # fails fast without sending requests
+    with pytest.raises(CircuitOpenError):
+        client.get()
+    assert client.calls == 3
+
+    time.sleep(0.1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    client.errors = []
+    assert client.get() == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
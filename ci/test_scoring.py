@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+
+from adversarial_vision_challenge import scoring
+
+
+def distance(X, Y):
+    # the reference implementation of the test scripts
+    X = X.astype(np.float64) / 255
+    Y = Y.astype(np.float64) / 255
+    return np.linalg.norm(X - Y)
+
+
+def worst_case_distance(X):
+    worst_case = np.zeros_like(X)
+    worst_case[X < 128] = 255
+    return distance(X, worst_case)
+
+
+def test_distances():
+    np.random.seed(22)
+    originals = np.random.randint(0, 256, (20, 64, 64, 3)).astype(np.uint8)
+    adversarials = np.clip(originals.astype(int) + np.random.randint(
+        -20, 20, originals.shape), 0, 255).astype(np.uint8)
+    valid = np.arange(20) % 3 != 0
+
+    result = scoring.distances(originals, adversarials, valid)
+    for i in range(20):
+        if valid[i]:
+            expected = distance(originals[i], adversarials[i])
+        else:
+            expected = worst_case_distance(originals[i])
+        np.testing.assert_allclose(result[i], expected, rtol=1e-12)
+
+
+def test_score_attack(tmpdir):
+    originals_folder = str(tmpdir.mkdir('images'))
+    results_folder = str(tmpdir.mkdir('results'))
+    original = np.full((64, 64, 3), 100, dtype=np.uint8)
+    for k in range(4):
+        np.save(os.path.join(originals_folder, 'img{}.npy'.format(k)),
+                original)
+    np.save(os.path.join(results_folder, 'img0.npy'), original)
+    adversarial = original.copy()
+    adversarial[0, 0, 0] += 40
+    np.save(os.path.join(results_folder, 'img1.npy'), adversarial)
+    np.save(os.path.join(results_folder, 'img2.npy'), original + 10)
+    np.save(os.path.join(results_folder, 'img3.npy'), original[:32])
+    np.save(os.path.join(originals_folder, 'img4.npy'), original)
+    np.save(os.path.join(results_folder, 'img4.npy'),
+            np.asfortranarray(original + 10))
+
+    report = scoring.score_attack(originals_folder, results_folder,
+                                  chunk_size=3)
+    assert report['results'] == 5
+    assert report['successes'] == 3
+    assert [sample['valid'] for sample in report['samples']] == [
+        True, True, True, False, True]
+    np.testing.assert_allclose(
+        report['median'], distance(original, original + 10))
+
+
+def test_no_results():
+    empty = np.zeros((0, 64, 64, 3), dtype=np.uint8)
+    assert scoring.distances(empty, empty).shape == (0,)
+    report = scoring.score([], np.zeros(0), np.zeros(0, dtype=bool))
+    assert report['results'] == 0
+    assert np.isnan(report['median'])
+
+
+def test_incremental_scorer(tmpdir):
+    originals_folder = str(tmpdir.mkdir('images'))
+    results_folder = str(tmpdir.mkdir('results'))
+
+    original = np.full((64, 64, 3), 100, dtype=np.uint8)
+    for name in ['img0.npy', 'img1.npy']:
+        np.save(os.path.join(originals_folder, name), original)
+
+    scorer = scoring.IncrementalScorer(originals_folder, results_folder)
+    scorer.add([])
+    assert len(scorer) == 0
+
+    np.save(os.path.join(results_folder, 'img0.npy'), original)
+    scorer.add(['img0.npy'])
+    assert len(scorer) == 1
+    assert scorer.successes() == 0
+
+    # written again
+    np.save(os.path.join(results_folder, 'img0.npy'), original + 10)
+    np.save(os.path.join(results_folder, 'img1.npy'), original[:32])
+    scorer.add(['img0.npy', 'img1.npy'])
+    assert len(scorer) == 2
+    assert scorer.successes() == 2
+
+    report = scorer.report()
+    assert report == scoring.score_attack(originals_folder, results_folder)
+
+
+def test_incremental_scorer_missing(tmpdir):
+    originals_folder = str(tmpdir.mkdir('images'))
+    results_folder = str(tmpdir.mkdir('results'))
+
+    original = np.full((64, 64, 3), 100, dtype=np.uint8)
+    for name in ['img0.npy', 'img1.npy']:
+        np.save(os.path.join(originals_folder, name), original)
+    np.save(os.path.join(results_folder, 'img0.npy'), original + 60)
+
+    scorer = scoring.IncrementalScorer(
+        originals_folder, results_folder, keep_adversarials=True)
+    scorer.add(['img0.npy'])
+
+    report = scorer.report(['img0.npy', 'img1.npy'])
+    assert [sample['valid'] for sample in report['samples']] == [True, False]
+    np.testing.assert_allclose(
+        report['samples'][1]['distance'], worst_case_distance(original))
+    assert len(scorer) == 1
+
+    file_names, adversarials = scorer.adversarials()
+    assert file_names == ['img0.npy']
+    assert (adversarials == original + 60).all()
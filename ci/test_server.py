@@ -0,0 +1,370 @@
+import json
+import marshal
+import multiprocessing
+import pstats
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from adversarial_vision_challenge import server
+from adversarial_vision_challenge import wire_codecs
+from adversarial_vision_challenge.profiler import RequestProfiler
+from adversarial_vision_challenge.quota import SharedQuota
+
+
+class NumpyModel(object):
+    """Predicts the class given by the first pixel of the image."""
+
+    def channel_axis(self):
+        return 3
+
+    def bounds(self):
+        return (0, 255)
+
+    def predictions(self, image):
+        return int(image[0, 0, 0]) % 200
+
+    def batch_predictions(self, images):
+        logits = np.zeros((len(images), 200), dtype=np.float32)
+        logits[np.arange(len(images)), images[:, 0, 0, 0].astype(int) % 200] = 1
+        return logits
+
+
+def _get_free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def create_client(model=None):
+    app = server._create_app(model or NumpyModel())
+    return app.test_client()
+
+
+def post(client, path, data, codec=wire_codecs.BSON):
+    response = client.post(path, data=codec.encode(data),
+                           headers={'content-type': codec.content_type})
+    return response, codec.decode(response.data)
+
+
+def random_images(n):
+    np.random.seed(22)
+    return np.random.randint(0, 256, size=(n, 64, 64, 3)).astype(np.uint8)
+
+
+def test_predict():
+    client = create_client()
+    image = random_images(1)[0]
+    response, result = post(client, '/predict', {'image': image})
+    assert response.status_code == 200
+    assert result['prediction'] == image[0, 0, 0] % 200
+
+
+def test_predict_batch():
+    client = create_client()
+    images = random_images(8)
+    remaining = server.quota.remaining()
+    response, result = post(client, '/predict_batch', {'images': images})
+    assert response.status_code == 200
+    assert result['predictions'] == [int(x) % 200 for x in images[:, 0, 0, 0]]
+    assert server.quota.remaining() == remaining - 8
+
+
+def test_raw_array_codec():
+    client = create_client()
+    codec = wire_codecs.get_codec('application/x-avc-raw')
+    images = random_images(3)
+    response, result = post(client, '/predict_batch', {'images': images},
+                            codec=codec)
+    assert response.mimetype == codec.content_type
+    assert result['predictions'] == [int(x) % 200 for x in images[:, 0, 0, 0]]
+
+
+def test_micro_batching(monkeypatch):
+    monkeypatch.setenv('MICRO_BATCHING_MAX_SIZE', '4')
+    monkeypatch.setenv('MICRO_BATCHING_MAX_DELAY', '1')
+    client = create_client()
+    images = random_images(8)
+    results = [None] * len(images)
+
+    def predict(i):
+        results[i] = post(client, '/predict', {'image': images[i]})[1]
+
+    threads = [threading.Thread(target=predict, args=(i,))
+               for i in range(len(images))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [r['prediction'] for r in results] == \
+        [int(x) % 200 for x in images[:, 0, 0, 0]]
+
+    stats = json.loads(client.get('/batching_stats').data.decode('utf-8'))
+    assert stats['images'] == 8
+    assert stats['batch_sizes'] == {'4': 2}
+
+
+def test_shared_quota():
+    quota = SharedQuota(100)
+
+    def consume():
+        for _ in range(50):
+            quota.consume()
+
+    workers = [multiprocessing.Process(target=consume) for _ in range(4)]
+    workers += [threading.Thread(target=consume) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert quota.remaining() == 0
+    assert quota.stats()['rejected'] == 200
+
+
+def test_quota_checkpoint(tmpdir):
+    path = str(tmpdir.join('quota.json'))
+    quota = SharedQuota(100, checkpoint_file=path, checkpoint_every=30)
+    quota.consume(10)
+
+    # a crashed server restarts with the pessimistic checkpoint
+    assert SharedQuota(100, checkpoint_file=path).remaining() == 60
+
+    quota.consume(25)
+    assert quota.consume(70) < 0
+    quota.checkpoint()
+    assert SharedQuota(100, checkpoint_file=path).remaining() == 65
+
+
+def test_too_many_requests(monkeypatch):
+    monkeypatch.setattr(server, 'quota', SharedQuota(1))
+    client = create_client()
+    image = random_images(1)[0]
+    response, _ = post(client, '/predict', {'image': image})
+    assert response.status_code == 200
+    response = client.post(
+        '/predict', data=wire_codecs.BSON.encode({'image': image}),
+        headers={'content-type': wire_codecs.BSON.content_type})
+    assert response.status_code == 429
+
+    stats = json.loads(client.get('/quota').data.decode('utf-8'))
+    assert stats == {'limit': 1, 'used': 1, 'remaining': 0, 'rejected': 1}
+
+
+def test_too_many_requests_keep_alive(monkeypatch):
+    # the body of a rejected request must not break the kept-alive
+    # connection, which the test client does not use
+    import requests
+
+    port = _get_free_port()
+    monkeypatch.setenv('MODEL_PORT', str(port))
+    monkeypatch.setenv('MODEL_WARMUP_ROUNDS', '0')
+    monkeypatch.setattr(server, 'quota', SharedQuota(1))
+    thread = threading.Thread(target=server.model_server, args=(NumpyModel(),))
+    thread.daemon = True
+    thread.start()
+
+    url = 'http://localhost:{}'.format(port)
+    for _ in range(100):
+        try:
+            requests.get(url + '/ready', timeout=1)
+            break
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.05)
+
+    session = requests.Session()
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    data = wire_codecs.BSON.encode({'image': image})
+    headers = {'content-type': wire_codecs.BSON.content_type}
+    assert session.post(url + '/predict', data=data,
+                        headers=headers).status_code == 200
+    # the unread body of the rejected request would be parsed as the
+    # next request on the connection
+    for _ in range(10):
+        assert session.post(url + '/predict', data=data,
+                            headers=headers).status_code == 429
+
+    response = session.get(url + '/quota')
+    assert response.status_code == 200
+    assert response.json()['rejected'] == 10
+    # the pools the session used, connection_from_url could create a new
+    # one as the pool key depends on the version of requests
+    pools = session.get_adapter(url).poolmanager.pools
+    assert [pools[key].num_connections for key in pools.keys()] == [1]
+
+
+class CountingModel(NumpyModel):
+    def __init__(self):
+        self.calls = 0
+
+    def predictions(self, image):
+        self.calls += 1
+        return super(CountingModel, self).predictions(image)
+
+    def batch_predictions(self, images):
+        self.calls += len(images)
+        return super(CountingModel, self).batch_predictions(images)
+
+
+def test_prediction_cache(monkeypatch):
+    monkeypatch.setenv('PREDICTION_CACHE_SIZE', '10')
+    monkeypatch.setenv('MODEL_WARMUP_ROUNDS', '0')
+    model = CountingModel()
+    client = create_client(model)
+    images = random_images(3)
+    remaining = server.quota.remaining()
+
+    post(client, '/predict', {'image': images[0]})
+    post(client, '/predict', {'image': images[0]})
+    _, result = post(client, '/predict_batch', {'images': images})
+
+    assert result['predictions'] == [int(x) % 200 for x in images[:, 0, 0, 0]]
+    assert model.calls == 3
+    assert server.quota.remaining() == remaining - 5
+
+    stats = json.loads(client.get('/cache_stats').data.decode('utf-8'))
+    assert stats['hits'] == 2
+    assert stats['misses'] == 3
+
+
+def test_metrics(monkeypatch):
+    monkeypatch.setattr(server, 'quota', SharedQuota(3))
+    client = create_client()
+    images = random_images(4)
+    post(client, '/predict', {'image': images[0]})
+    post(client, '/predict_batch', {'images': images[:2]})
+    response = client.post(
+        '/predict_batch', data=wire_codecs.BSON.encode({'images': images}),
+        headers={'content-type': wire_codecs.BSON.content_type})
+    assert response.status_code == 429
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    lines = response.data.decode('utf-8').splitlines()
+    assert 'avc_requests_total{endpoint="predict_batch"} 2.0' in lines
+    assert 'avc_too_many_requests_total{endpoint="predict_batch"} 1.0' in lines
+    assert 'avc_requests_in_flight{endpoint="predict"} 0.0' in lines
+    assert 'avc_quota_remaining 0.0' in lines
+    for phase in ['decode', 'validate', 'preprocess', 'predict', 'encode']:
+        count = 3 if phase in ['decode', 'validate'] else 2
+        assert 'avc_phase_seconds_count{{phase="{}"}} {}'.format(
+            phase, count) in lines
+    assert 'avc_phase_seconds_bucket{phase="decode",le="+Inf"} 3' in lines
+
+
+def test_profiler(tmpdir, monkeypatch):
+    path = str(tmpdir.join('requests.prof'))
+    monkeypatch.setenv('PROFILE_REQUESTS', '2')
+    monkeypatch.setenv('PROFILE_OUTPUT_FILE', path)
+    client = create_client()
+    images = random_images(6)
+    for image in images[:4]:
+        post(client, '/predict', {'image': image})
+    assert pstats.Stats(path).total_calls > 0
+
+    assert client.get('/profile/capture?requests=2').status_code == 200
+    post(client, '/predict', {'image': images[4]})
+    post(client, '/predict_batch', {'images': images})
+    summary = client.get('/profile').data.decode('utf-8')
+    assert '_predict_batch' in summary
+
+    response = client.get('/profile?format=pstats')
+    assert response.status_code == 200
+    stats = marshal.loads(response.data)
+    assert any(name == '_predict_batch' for _, _, name in stats)
+
+
+def test_profiler_concurrent_requests():
+    profiler = RequestProfiler(1)
+    started = []
+    release = threading.Event()
+    results = []
+
+    def request(k):
+        started.append(k)
+        release.wait(10)
+        return k
+
+    def run(k):
+        results.append(profiler.run(request, k))
+
+    threads = [threading.Thread(target=run, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    # all requests are in flight at the same time
+    while len(started) < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert profiler.profiled == 1
+
+
+class SlowStartingModel(NumpyModel):
+    """Blocks the first prediction until started is set."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.batch_sizes = []
+
+    def predictions(self, image):
+        self.started.wait()
+        return super(SlowStartingModel, self).predictions(image)
+
+    def batch_predictions(self, images):
+        self.batch_sizes.append(len(images))
+        return super(SlowStartingModel, self).batch_predictions(images)
+
+
+def test_warm_up(monkeypatch):
+    monkeypatch.setenv('MODEL_WARMUP_BATCH_SIZES', '1,16')
+    model = SlowStartingModel()
+    client = create_client(model)
+
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert json.loads(response.data.decode('utf-8'))['ready'] is False
+
+    model.started.set()
+    for _ in range(100):
+        response = client.get('/ready')
+        if response.status_code == 200:
+            break
+        time.sleep(0.01)
+    status = json.loads(response.data.decode('utf-8'))
+    assert status['ready'] is True
+    assert status['cold_start_seconds'] > 0
+    assert model.batch_sizes == [1, 16]
+
+    lines = client.get('/metrics').data.decode('utf-8').splitlines()
+    assert any(line.startswith('avc_cold_start_seconds ') for line in lines)
+
+
+def test_forked_workers_fail_to_start(monkeypatch):
+    monkeypatch.setenv('MODEL_SERVER_WORKERS', '2')
+    monkeypatch.setenv('MODEL_PORT', str(_get_free_port()))
+    monkeypatch.setattr(server, 'quota', SharedQuota(10))
+
+    class UnitModel(NumpyModel):
+        def bounds(self):
+            return (0, 1)
+
+    # the model is checked before forking
+    with pytest.raises(AssertionError):
+        server.model_server(UnitModel())
+
+    # invalid configuration, the workers fail to create the app
+    monkeypatch.setenv('MICRO_BATCHING_MAX_SIZE', 'invalid')
+    start = time.time()
+    with pytest.raises(RuntimeError):
+        server.model_server(NumpyModel())
+    assert time.time() - start < 10
@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import yaml
+
+from adversarial_vision_challenge import read_images, get_test_data
+from adversarial_vision_challenge.adversarial_writer import AdversarialWriter
+from adversarial_vision_challenge.image_store import ImageStore, pack_images
+
+
+def write_images(directory, n):
+    labels = {}
+    for k in range(n):
+        image = np.full((64, 64, 3), k, dtype=np.uint8)
+        np.save(os.path.join(directory, 'img{}.npy'.format(k)), image)
+        labels['img{}.npy'.format(k)] = k
+    path = os.path.join(directory, 'labels.yml')
+    with open(path, 'w') as outfile:
+        yaml.dump(labels, outfile)
+    return path
+
+
+def test_read_images(tmpdir, monkeypatch):
+    directory = str(tmpdir)
+    monkeypatch.setenv('INPUT_YML_PATH', write_images(directory, 20))
+    monkeypatch.setenv('INPUT_IMG_PATH', directory)
+
+    for dtype in [np.float32, np.uint8]:
+        for prefetch in [0, 4]:
+            images = list(read_images(dtype=dtype, prefetch=prefetch))
+            assert len(images) == 20
+            for file_name, image, label in images:
+                assert file_name == 'img{}.npy'.format(label)
+                assert image.dtype == dtype
+                assert (image == label).all()
+
+
+def test_image_store(tmpdir, monkeypatch):
+    directory = str(tmpdir)
+    label_file = write_images(directory, 5)
+    with open(label_file, 'r') as ymlfile:
+        labels = yaml.safe_load(ymlfile)
+    pack_images(labels, directory, os.path.join(directory, 'packed'))
+
+    store = ImageStore(os.path.join(directory, 'packed'))
+    assert len(store) == 5
+    assert (store.get('img3.npy') == 3).all()
+
+    monkeypatch.setenv('INPUT_IMG_PATH', os.path.join(directory, 'packed'))
+    for file_name, image, label in read_images(dtype=np.uint8):
+        assert file_name == 'img{}.npy'.format(label)
+        assert (image == label).all()
+
+
+def test_get_test_data():
+    test_data = get_test_data()
+    assert len(test_data) == 500
+    image, label = test_data[0]
+    assert image.shape == (64, 64, 3)
+    assert image.dtype == np.uint8
+    assert 0 <= label < 200
+
+
+class RecordingNotifier(object):
+    def __init__(self):
+        self.stored = []
+
+    def store_adversarial(self, file_name):
+        self.stored.append(file_name)
+
+
+def test_adversarial_writer(tmpdir):
+    notifier = RecordingNotifier()
+    writer = AdversarialWriter(max_pending=2, notifier=notifier)
+    for k in range(10):
+        image = np.full((64, 64, 3), k, dtype=np.uint8)
+        writer.store(os.path.join(str(tmpdir), 'img{}'.format(k)),
+                     'img{}.npy'.format(k), image)
+    writer.flush()
+
+    assert notifier.stored == ['img{}.npy'.format(k) for k in range(10)]
+    for k in range(10):
+        image = np.load(os.path.join(str(tmpdir), 'img{}.npy'.format(k)))
+        assert (image == k).all()
+
+
+def test_store_adversarial_flushes_at_exit(tmpdir):
+    # the attack exits without calling attack_complete
+    script = (
+        'import numpy as np\n'
+        'from adversarial_vision_challenge import store_adversarial\n'
+        'for k in range(50):\n'
+        '    store_adversarial("img{}.npy".format(k),\n'
+        '                      np.zeros((64, 64, 3), dtype=np.uint8))\n')
+    notification_file = str(tmpdir.join('notifications.jsonl'))
+    env = dict(os.environ, OUTPUT_ADVERSARIAL_PATH=str(tmpdir),
+               NOTIFICATION_FILE=notification_file)
+    subprocess.check_call([sys.executable, '-c', script], env=env)
+
+    assert len(tmpdir.listdir('img*.npy')) == 50
+    with open(notification_file) as f:
+        notifications = [json.loads(line) for line in f]
+    stored = sum(notification['payload'].get('count', 1)
+                 for notification in notifications
+                 if notification['event_type'] == 'AVC.ATTACK.STORE_ADVERSARIAL')
+    assert stored == 50
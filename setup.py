@@ -36,11 +36,15 @@ install_requires = [
     'tqdm'
 ]
 
+async_require = [
+    "aiohttp ; python_version>='3.5'"
+]
+
 tests_require = [
     'pytest',
     'pytest-cov',
     'tensorflow'
-]
+] + async_require
 
 setup(
     name="adversarial_vision_challenge",
@@ -70,12 +74,16 @@ setup(
         'bin/avc-test-attack',
         'bin/avc-test-untargeted-attack',
         'bin/avc-test-targeted-attack',
-        'bin/avc-submit'
+        'bin/avc-submit',
+        'bin/avc-pack-images',
+        'bin/avc-score-attack',
+        'bin/avc-run-local'
     ],
     include_package_data=True,
     zip_safe=False,
     install_requires=install_requires,
     extras_require={
+        'async': async_require,
         'testing': tests_require,
     },
 )